@@ -4,15 +4,33 @@ Flask server to handle Gemini AI requests securely
 Production-ready with proper error handling and logging
 """
 
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import google.generativeai as genai
+import json
 import os
 import logging
-import traceback
+import sqlite3
+import threading
 import time
+import traceback
 from dotenv import load_dotenv
 
+from compression import COMPRESS_MIN_BYTES, CompressedBodyCache, etag_for, etag_matches, negotiate
+from gemini_async import AsyncGeminiClient
+from jobs import FINISHED, PRIORITIES, JobQueue, JobStore, QueueFull
+from llm_providers import create_provider
+from matching import MatchIndex, MatchStore, normalize_profile, profile_id
+from metrics import Gauge, Histogram, registry, stage
+from prompts import (build_bank_topup_prompt, build_presession_prompt, build_presession_topup_prompt,
+                     generate_prompt)
+from question_bank import QuestionBank, allocate_slots
+from quiz import (final_question, format_question, missing_questions, parse_question_block,
+                  parse_quiz, split_complete_questions)
+from rate_limiter import RateLimiter
+from response_cache import PersistentCache, ResponseCache, cache_key
+from similarity_cache import SimilarityCache
+from singleflight import SingleFlight
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,34 +48,117 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
-# Configure Gemini AI with validation
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-if not GEMINI_API_KEY:
-    logger.error("GEMINI_API_KEY not found in environment variables")
-    raise ValueError(
-        "GEMINI_API_KEY not found! Please set it in backend/.env file.\n"
-        "Get your API key from: https://makersuite.google.com/app/apikey"
-    )
+# Gemini model settings
+GEMINI_MODEL_NAME = 'models/gemini-2.5-flash'
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 8192,  # Increased for 20-question quizzes
+}
+
+# LLM backend: Gemini (needs GEMINI_API_KEY) or LLM_PROVIDER=stub for offline load tests
+# A missing key no longer stops the server from starting; generation requests fail instead
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+llm_provider = create_provider(LLM_PROVIDER, GEMINI_MODEL_NAME, GENERATION_CONFIG)
+
+# The Gemini SDK import and model setup run in a background thread so /health
+# answers immediately on cold starts; progress is reported under /health startup
+llm_provider.start_warm_up()
+
+# Provider model name (also part of the cache key, so stub output never mixes with Gemini's)
+MODEL_NAME = llm_provider.model_name
+
+# In-memory LRU cache to reduce API calls (cleared on restart)
+# Byte budget sized for the 512MB free-tier instance
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+request_cache = ResponseCache(max_bytes=CACHE_MAX_BYTES)
+
+# Identical prompts already in flight wait for one upstream call
+inflight = SingleFlight()
+
+# Optional on-disk tier shared by all workers and kept across worker recycling
+PERSISTENT_CACHE_PATH = os.getenv('PERSISTENT_CACHE_PATH')
+PERSISTENT_CACHE_MAX_BYTES = int(os.getenv('PERSISTENT_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+persistent_cache = None
+if PERSISTENT_CACHE_PATH:
+    try:
+        persistent_cache = PersistentCache(PERSISTENT_CACHE_PATH, max_bytes=PERSISTENT_CACHE_MAX_BYTES)
+        logger.info(f"Persistent cache enabled at {PERSISTENT_CACHE_PATH}")
+    except Exception as e:
+        logger.error(f"Persistent cache disabled: {str(e)}")
+
+# Near-duplicate topics ("newton's laws" / "Newtons laws of motion") reuse cached
+# notes and flashcards once SIMILARITY_CACHE_THRESHOLD is set; unset, lookups are
+# only scored so /cache/stats similarity.by_threshold shows the hit rate it would give
+SIMILARITY_CONTENT_TYPES = ('notes', 'flashcards')
+SIMILARITY_CACHE_THRESHOLD = os.getenv('SIMILARITY_CACHE_THRESHOLD')
+similarity_cache = SimilarityCache(
+    threshold=float(SIMILARITY_CACHE_THRESHOLD) if SIMILARITY_CACHE_THRESHOLD else None,
+    content_types=SIMILARITY_CONTENT_TYPES)
+
+# Compressed JSON bodies keyed by ETag, so repeat answers for a cached topic skip recompression
+COMPRESSED_CACHE_MAX_BYTES = int(os.getenv('COMPRESSED_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+compressed_bodies = CompressedBodyCache(max_bytes=COMPRESSED_CACHE_MAX_BYTES)
 
-# Log first/last 4 chars of key for debugging (safe to log)
-logger.info(f"Using API key: {GEMINI_API_KEY[:8]}...{GEMINI_API_KEY[-4:]}")
+# POST endpoints that only read (possibly cached) generations: a matching
+# If-None-Match gets 304 like a GET would
+CONDITIONAL_POST_PATHS = ('/generate-notes', '/generate-flashcards', '/generate-quiz')
 
+# Question bank for assembling pre-session quizzes without a full generation
+# Set QUESTION_BANK_PATH to an empty string to disable
+QUESTION_BANK_PATH = os.getenv('QUESTION_BANK_PATH', 'question_bank.db')
+question_bank = None
+if QUESTION_BANK_PATH:
+    try:
+        question_bank = QuestionBank(QUESTION_BANK_PATH)
+        logger.info(f"Question bank enabled at {QUESTION_BANK_PATH}")
+    except Exception as e:
+        logger.error(f"Question bank disabled: {str(e)}")
+
+# Long generations can run as background jobs ({"async": true})
+# JOB_STORE_PATH records jobs in SQLite so status polls work from any worker
+# and after --max-requests recycling (jobs cut off by a recycle report interrupted)
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH')
+job_store = None
+if JOB_STORE_PATH:
+    try:
+        job_store = JobStore(JOB_STORE_PATH)
+        logger.info(f"Job store enabled at {JOB_STORE_PATH}")
+    except Exception as e:
+        logger.error(f"Job store disabled: {str(e)}")
+job_queue = JobQueue(store=job_store)
+
+# Default job priority per content type: interactive tools ahead of bulk quizzes
+JOB_PRIORITIES = {
+    'flashcards': 'high',
+    'notes': 'high',
+    'quiz': 'normal',
+    'presession_quiz': 'low'
+}
+
+# Longest a GET /jobs/<id>?wait= long-poll holds a thread (seconds)
+JOB_MAX_POLL_WAIT = 25
+
+# Server-side match index (profiles pushed via /matches/profiles)
+# MATCH_STORE_PATH keeps profiles and rejections in SQLite: the index is rebuilt
+# after a worker recycle and picks up changes saved by other workers
+MATCH_STORE_PATH = os.getenv('MATCH_STORE_PATH')
+match_store = None
+if MATCH_STORE_PATH:
+    try:
+        match_store = MatchStore(MATCH_STORE_PATH)
+        logger.info(f"Match store enabled at {MATCH_STORE_PATH}")
+    except Exception as e:
+        logger.error(f"Match store disabled: {str(e)}")
+match_index = MatchIndex(store=match_store)
 try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Lazy loading: Model initialized on first request to save memory
-    model = None
-    logger.info("Gemini API configured successfully - model will initialize on first request")
+    match_index.sync()
 except Exception as e:
-    logger.error(f"Failed to configure Gemini API: {str(e)}")
-    raise
-
-# Simple in-memory cache to reduce API calls (cleared on restart)
-request_cache = {}
-MAX_CACHE_SIZE = 50  # Limit cache to save memory
+    logger.error(f"Match index not restored: {str(e)}")
 
 
 @app.route('/', methods=['GET'])
@@ -71,148 +172,435 @@ def root():
             'notes': '/generate-notes',
             'flashcards': '/generate-flashcards',
             'quiz': '/generate-quiz',
-            'presession_quiz': '/generate-presession-quiz'
+            'batch': '/generate-batch',
+            'presession_quiz': '/generate-presession-quiz',
+            'job_status': '/jobs/<job_id>',
+            'match_profiles': '/matches/profiles',
+            'top_matches': '/matches/top',
+            'reject_match': '/matches/reject',
+            'cache_stats': '/cache/stats',
+            'metrics': '/metrics'
         }
     }), 200
 
 
 def get_model():
     """
-    Lazy load the Gemini model to save memory on startup
+    Model of the configured provider (Gemini is loaded lazily to save memory on startup)
     """
-    global model
-    if model is None:
-        model = genai.GenerativeModel(
-            'models/gemini-2.5-flash',
-            generation_config={
-                'temperature': 0.7,
-                'max_output_tokens': 8192,  # Increased for 20-question quizzes
-            }
-        )
-        logger.info("Gemini model initialized")
-    return model
+    return llm_provider.get_model()
+
 
-def safe_generate_content(prompt, max_retries=3):
+# Gemini calls run on a background event loop with bounded concurrency
+# Client-side RPM/TPM quota for MODEL_NAME (GEMINI_RPM / GEMINI_TPM)
+rate_limiter = RateLimiter()
+gemini_client = AsyncGeminiClient(get_model, limiter=rate_limiter)
+
+# Prometheus metrics (GET /metrics); gauges are read at scrape time
+REQUEST_SECONDS = registry.register(Histogram(
+    'peerfuse_request_seconds', 'HTTP request latency per endpoint', ('endpoint', 'method', 'status')))
+
+
+def _cache_lookups():
+    counts = {('memory', 'hit'): request_cache.hits, ('memory', 'miss'): request_cache.misses}
+    if persistent_cache is not None:
+        counts.update({('persistent', 'hit'): persistent_cache.hits,
+                       ('persistent', 'miss'): persistent_cache.misses})
+    if similarity_cache.threshold is not None:
+        counts.update({('similarity', 'hit'): similarity_cache.hits,
+                       ('similarity', 'miss'): similarity_cache.lookups - similarity_cache.hits})
+    return counts
+
+
+registry.register(Gauge(
+    'peerfuse_cache_lookups_total', 'Response cache lookups by tier and result',
+    _cache_lookups, labels=('tier', 'result'), kind='counter'))
+registry.register(Gauge(
+    'peerfuse_similarity_would_hit_total', 'Near-duplicate lookups scoring at or above each threshold',
+    lambda: {(str(t),): n for t, n in similarity_cache.would_hit.items()}, labels=('threshold',), kind='counter'))
+registry.register(Gauge(
+    'peerfuse_singleflight_deduplicated_total', 'Requests served by an identical in-flight call',
+    lambda: inflight.deduplicated, kind='counter'))
+registry.register(Gauge(
+    'peerfuse_jobs', 'Background jobs by state',
+    lambda: {(state,): n for state, n in job_queue.stats().items() if state in ('queued', 'running')},
+    labels=('state',)))
+registry.register(Gauge(
+    'peerfuse_gemini_in_flight', 'Gemini calls holding a concurrency slot', lambda: gemini_client.in_flight))
+registry.register(Gauge(
+    'peerfuse_rate_limit_paused_seconds', 'Remaining quota pause after a 429',
+    lambda: rate_limiter.stats()['paused_for']))
+registry.register(Gauge(
+    'peerfuse_llm_ready', 'LLM provider warm-up finished (1) or not (0)',
+    lambda: int(llm_provider.readiness()['ready'])))
+registry.register(Gauge(
+    'peerfuse_active_threads', 'Live Python threads in this process', threading.active_count))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # No-op once started in this process; restarts warm-up in forked workers
+    llm_provider.start_warm_up()
+
+
+@app.after_request
+def record_request_latency(response):
+    # Streaming responses are timed until headers are sent, not until the stream ends
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                                method=request.method, status=response.status_code)
+    return response
+
+
+@app.after_request
+def encode_response(response):
+    """ETag / If-None-Match (304) and negotiated gzip or brotli for JSON bodies"""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    etag = etag_for(data)
+    response.headers['ETag'] = etag
+    response.vary.add('Accept-Encoding')
+    conditional = request.method in ('GET', 'HEAD') or request.path in CONDITIONAL_POST_PATHS
+    if conditional and etag_matches(request.headers.get('If-None-Match'), etag):
+        response.status_code = 304
+        response.set_data(b'')
+        return response
+
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding and len(data) >= COMPRESS_MIN_BYTES:
+        with stage('compression'):
+            response.set_data(compressed_bodies.get_or_compress(etag, encoding, data))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+class ResponseWrapper:
+    """Wrap generated text to keep the response interface consistent"""
+    def __init__(self, txt):
+        self.text = txt
+
+
+def safe_generate_content(prompt, max_retries=3, content_type='default', topic=None, cache_if=None):
     """
     Safely generate content with retry logic for rate limits
-    Includes basic caching to reduce API calls
+    Includes LRU/TTL caching to reduce API calls
+    Concurrent requests for the same prompt share one upstream call
+    With a topic, notes/flashcards for a near-duplicate topic are reused
+    With cache_if, a fresh generation is only cached when cache_if(text) is true
     """
-    cache_key = hash(prompt)
-    if cache_key in request_cache:
+    key = cache_key(prompt, {'model': MODEL_NAME, **GENERATION_CONFIG})
+    with stage('cache_lookup', content_type):
+        cached = request_cache.get(key)
+    if cached is not None:
         logger.info("Returning cached response")
-        return request_cache[cache_key]
+        _similar_add(content_type, topic, key)
+        return ResponseWrapper(cached)
+
+    text, similar = inflight.do(
+        key, lambda: _load_or_generate(key, prompt, max_retries, content_type, topic, cache_if))
+    if not similar:
+        _similar_add(content_type, topic, key)
+    return ResponseWrapper(text)
+
+
+def _load_or_generate(key, prompt, max_retries, content_type, topic=None, cache_if=None):
+    """
+    Persistent cache lookup, then a near-duplicate topic, then Gemini on a miss
+    (run once per in-flight key); returns (text, served from a similar topic)
+    """
+    found = _load_cached(key, content_type, topic)
+    if found is not None:
+        return found
+
+    # The Gemini call runs on the async client; this thread only waits for it
+    try:
+        with stage('upstream', content_type):
+            text = gemini_client.generate(prompt, max_retries=max_retries)
+    except Exception as e:
+        logger.error(f"Final error: {str(e)}\n{traceback.format_exc()}")
+        raise
+
+    if cache_if is None or cache_if(text):
+        _cache_store(key, text, content_type)
+    else:
+        logger.info(f"Not caching unusable {content_type} response")
+    return text, False
 
-    for attempt in range(max_retries):
+
+def _load_cached(key, content_type, topic=None):
+    """Persistent tier, then a near-duplicate topic: (text, similar) or None"""
+    cached = _persistent_get(key, content_type)
+    if cached is not None:
+        logger.info("Returning persisted response")
+        return cached, False
+
+    cached = _similar_get(content_type, topic)
+    if cached is not None:
+        return cached, True
+    return None
+
+
+def generate_many(entries, max_retries=3):
+    """
+    safe_generate_content for several (key, prompt, content type, topic) entries
+    that missed the memory tier, without a thread per entry: lower tiers are
+    checked here, then every remaining prompt goes to Gemini as one gather on
+    the event loop. Keys another request is already generating wait for it
+    Returns ({key: text}, {key: error message})
+    """
+    texts, errors = {}, {}
+    claimed = {}    # key -> future this request must finish
+    followers = {}  # key -> future of another request's call
+    pending = []
+    try:
+        for key, prompt, content_type, topic in entries:
+            future, leader = inflight.begin(key)
+            if not leader:
+                followers[key] = future
+                continue
+            claimed[key] = future
+            found = _load_cached(key, content_type, topic)
+            if found is None:
+                pending.append((key, prompt, content_type, topic))
+                continue
+            texts[key] = found[0]
+            if not found[1]:
+                _similar_add(content_type, topic, key)
+            inflight.finish(key, claimed.pop(key), result=found)
+
+        if pending:
+            try:
+                with stage('upstream', 'batch'):
+                    outcomes = gemini_client.generate_many([prompt for _, prompt, _, _ in pending],
+                                                           max_retries=max_retries)
+            except Exception as e:
+                outcomes = [e] * len(pending)
+            for (key, _, content_type, topic), outcome in zip(pending, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"Batch item failed: {str(outcome)}")
+                    errors[key] = str(outcome)
+                    inflight.finish(key, claimed.pop(key), error=outcome)
+                    continue
+                _cache_store(key, outcome, content_type)
+                _similar_add(content_type, topic, key)
+                texts[key] = outcome
+                inflight.finish(key, claimed.pop(key), result=(outcome, False))
+    finally:
+        for key, future in claimed.items():
+            inflight.finish(key, future, error=RuntimeError('Batch generation aborted'))
+
+    for key, future in followers.items():
         try:
-            m = get_model()
-            response = m.generate_content(prompt)
+            texts[key] = future.result(gemini_client.call_timeout)[0]
+        except Exception as e:
+            logger.error(f"Batch item failed: {str(e)}")
+            errors[key] = str(e) or type(e).__name__
+    return texts, errors
 
-            # Robust text extraction from Gemini response
-            text = ""
 
-            if hasattr(response, 'text') and response.text:
-                text = response.text.strip()
+def _persistent_get(key, content_type):
+    """Read the on-disk tier (promoting hits into memory); None on miss or error"""
+    if persistent_cache is None:
+        return None
+    try:
+        cached = persistent_cache.get(key)
+    except Exception as e:
+        logger.warning(f"Persistent cache read failed: {str(e)}")
+        return None
+    if cached is not None:
+        request_cache.set(key, cached, content_type)
+    return cached
 
-            elif hasattr(response, 'candidates') and response.candidates:
-                try:
-                    text = response.candidates[0].content.parts[0].text.strip()
-                except Exception:
-                    text = ""
 
-            if not text:
-                raise Exception("Gemini returned empty output")
+def _cached_text(key, content_type):
+    cached = request_cache.get(key)
+    return cached if cached is not None else _persistent_get(key, content_type)
 
-            # Wrap response to keep interface consistent
-            class ResponseWrapper:
-                def __init__(self, txt):
-                    self.text = txt
 
-            wrapped = ResponseWrapper(text)
+def _peek_text(key):
+    """
+    Cached text from either tier without counting a lookup, for reads on
+    behalf of a request that already counted (or will count) its own
+    """
+    cached = request_cache.peek(key)
+    if cached is None and persistent_cache is not None:
+        try:
+            cached = persistent_cache.peek(key)
+        except Exception as e:
+            logger.warning(f"Persistent cache read failed: {str(e)}")
+    return cached
+
+
+def _similar_get(content_type, topic):
+    """Cached text generated for a near-duplicate topic, or None"""
+    if topic is None or content_type not in SIMILARITY_CONTENT_TYPES:
+        return None
+    with stage('similarity_lookup', content_type):
+        found = similarity_cache.lookup(content_type, topic, _peek_text)
+    if found is None:
+        return None
+    match, text = found
+    logger.info(f"Returning cached {content_type} for similar topic '{match.topic}' ({match.score:.2f})")
+    return text
 
-            # Cache successful response
-            if len(request_cache) < MAX_CACHE_SIZE:
-                request_cache[cache_key] = wrapped
-            else:
-                request_cache.clear()
-                request_cache[cache_key] = wrapped
-                logger.info("Cache cleared to save memory")
 
-            return wrapped
+def _similar_add(content_type, topic, key):
+    if topic is not None:
+        similarity_cache.add(content_type, topic, key)
 
+
+def _cache_store(key, text, content_type):
+    """Cache successful response in every tier"""
+    request_cache.set(key, text, content_type)
+    if persistent_cache is not None:
+        try:
+            persistent_cache.set(key, text, content_type)
         except Exception as e:
-            error_str = str(e)
-            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {error_str}")
-
-            if '429' in error_str or 'rate limit' in error_str.lower():
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"Rate limited. Waiting {wait_time}s before retry...")
-                    time.sleep(wait_time)
-                    continue
+            logger.warning(f"Persistent cache write failed: {str(e)}")
 
-            if attempt == max_retries - 1:
-                logger.error(f"Final error: {error_str}\n{traceback.format_exc()}")
-                raise
 
-    raise Exception("Failed after maximum retries")
+def wants_stream(data):
+    """Streaming requested via {"stream": true}, ?stream=1 or Accept: text/event-stream"""
+    return (bool(data.get('stream'))
+            or request.args.get('stream') in ('1', 'true')
+            or 'text/event-stream' in request.headers.get('Accept', ''))
 
-def generate_prompt(content_type, topic):
-    """Generate appropriate prompt based on content type"""
-    if content_type == "notes":
-        return f"""Create comprehensive study notes for the topic: "{topic}"
-        
-Include:
-- Key concepts and definitions
-- Important points to remember
-- Examples where applicable
 
-Format the notes clearly with headings and bullet points."""
-    elif content_type == "flashcards":
-        return f"""Create 5 flashcard Q&A pairs for the topic: "{topic}"
+def wants_async(data):
+    """Background job requested via {"async": true} or ?async=1"""
+    return bool(data.get('async')) or request.args.get('async') in ('1', 'true')
 
-Format each flashcard as:
-Q: [question]
-A: [answer]
 
-Separate each pair with a blank line. Make questions clear and answers concise but complete."""
-    elif content_type == "quiz":
-        return f"""Create a quiz for the topic: "{topic}" with 3 questions at different difficulty levels.
+def submit_job(kind, fn, data):
+    """Queue fn() as a job and answer 202 with its id (503 when the queue is full)"""
+    priority = data.get('priority')
+    if priority not in PRIORITIES:
+        priority = JOB_PRIORITIES.get(kind, 'normal')
+    try:
+        job = job_queue.submit(kind, fn, priority)
+    except QueueFull as e:
+        logger.warning(f"Rejected {kind} job: {str(e)}")
+        return jsonify({'success': False, 'error': 'Server busy, please retry shortly'}), 503
 
-Format as:
-[EASY] Question
-Answer: [answer]
+    logger.info(f"Queued {kind} job {job.id} ({priority} priority)")
+    return jsonify({
+        'success': True,
+        'jobId': job.id,
+        'status': job.status,
+        'statusUrl': f'/jobs/{job.id}',
+        'eventsUrl': f'/jobs/{job.id}/events'
+    }), 202
 
-[MEDIUM] Question
-Answer: [answer]
 
-[HARD] Question
-Answer: [answer]
+def sse_event(event, payload):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-Make questions challenging but fair."""
-    return f"Explain {topic}."
+
+def stream_generation(prompt, content_type, split_questions=False, extra=None, topic=None):
+    """
+    Server-sent events for a generation
+    chunk events forward Gemini text as it arrives; with split_questions each
+    complete "Question N" block is sent as a question event instead
+    A final done event carries the full content (error event on failure)
+    """
+    key = cache_key(prompt, {'model': MODEL_NAME, **GENERATION_CONFIG})
+
+    def events():
+        cached = _cached_text(key, content_type)
+        similar = cached is None and _similar_get(content_type, topic)
+        if similar:
+            cached = similar
+        pieces = [cached] if cached is not None else gemini_client.stream(prompt)
+
+        parts = []
+        buffer = ''
+        try:
+            for piece in pieces:
+                parts.append(piece)
+                if not split_questions:
+                    yield sse_event('chunk', {'text': piece})
+                    continue
+                buffer += piece
+                blocks, buffer = split_complete_questions(buffer)
+                for number, block in blocks:
+                    yield sse_event('question', {'number': number, 'text': block,
+                                                 'parsed': parse_question_block(number, block)})
+
+            if split_questions:
+                last = final_question(buffer)
+                if last is not None:
+                    yield sse_event('question', {'number': last[0], 'text': last[1],
+                                                 'parsed': parse_question_block(*last)})
+
+            text = ''.join(parts).strip()
+            if cached is None:
+                _cache_store(key, text, content_type)
+            if not similar:
+                _similar_add(content_type, topic, key)
+            logger.info(f"Successfully streamed {content_type}")
+            yield sse_event('done', dict(extra or {}, success=True, content=text))
+
+        except Exception as e:
+            logger.error(f"Error streaming {content_type}: {str(e)}\n{traceback.format_exc()}")
+            yield sse_event('error', {'success': False, 'error': f'Failed to generate content: {str(e)}'})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (answers during warm-up; see ready/startup)"""
     try:
+        startup = llm_provider.readiness()
         return jsonify({
             'status': 'ok',
             'message': 'PeerFuse Backend is running',
-            'gemini_configured': GEMINI_API_KEY is not None
+            'gemini_configured': llm_provider.configured,
+            'provider': llm_provider.name,
+            'ready': startup['ready'],
+            'startup': startup
         }), 200
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of request, Gemini, cache and queue metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Response cache hit/miss/eviction counters"""
+    stats = request_cache.stats()
+    stats['singleflight'] = inflight.stats()
+    stats['similarity'] = similarity_cache.stats()
+    if persistent_cache is not None:
+        stats['persistent'] = persistent_cache.stats()
+    if question_bank is not None:
+        stats['question_bank'] = question_bank.stats()
+    stats['compression'] = compressed_bodies.stats()
+    stats['rate_limiter'] = rate_limiter.stats()
+    stats['jobs'] = job_queue.stats()
+    stats['match_index'] = match_index.stats()
+    return jsonify(stats), 200
+
+
 @app.route('/list-models', methods=['GET'])
 def list_models():
     """List all available Gemini models"""
     try:
-        logger.info("Listing available Gemini models")
-        models = genai.list_models()
-        model_names = [m.name for m in models if 'generateContent' in m.supported_generation_methods]
+        logger.info(f"Listing available {llm_provider.name} models")
+        model_names = llm_provider.list_models()
         return jsonify({"models": model_names}), 200
     except Exception as e:
         logger.error(f"Error listing models: {str(e)}\n{traceback.format_exc()}")
@@ -241,20 +629,32 @@ def generate_content():
         endpoint = request.path.split('/')[-1].replace('generate-', '')
         logger.info(f"Generating {endpoint} for topic: {topic}")
         
-        prompt = generate_prompt(endpoint, topic)
-        
-        # Generate content using Gemini with retry logic
-        response = safe_generate_content(prompt)
-        
-        # Safely extract text
-        response_text = response.text if hasattr(response, 'text') else str(response)
-        
-        logger.info(f"Successfully generated {endpoint} for topic: {topic}")
-        return jsonify({
-            'success': True,
-            'topic': topic,
-            'content': response_text
-        }), 200
+        with stage('prompt_build', endpoint):
+            prompt = generate_prompt(endpoint, topic)
+
+        if wants_stream(data):
+            return stream_generation(prompt, endpoint, extra={'topic': topic}, topic=topic)
+
+        def generate():
+            # Generate content using Gemini with retry logic
+            response = safe_generate_content(prompt, content_type=endpoint, topic=topic)
+
+            # Safely extract text
+            response_text = response.text if hasattr(response, 'text') else str(response)
+
+            logger.info(f"Successfully generated {endpoint} for topic: {topic}")
+            return {
+                'success': True,
+                'topic': topic,
+                'content': response_text
+            }
+
+        if wants_async(data):
+            return submit_job(endpoint, generate, data)
+
+        body = generate()
+        with stage('serialization', endpoint):
+            return jsonify(body), 200
         
     except Exception as e:
         logger.error(f"Error generating content: {str(e)}\n{traceback.format_exc()}")
@@ -264,17 +664,218 @@ def generate_content():
         }), 500
 
 
+# Content types accepted by /generate-batch (same prompts as the single endpoints)
+BATCH_CONTENT_TYPES = ('notes', 'flashcards', 'quiz')
+BATCH_MAX_ITEMS = 12
+
+
+@app.route('/generate-batch', methods=['POST', 'OPTIONS'])
+def generate_batch():
+    """
+    Generate several {type, topic} items in one request
+    Duplicates and cached items are answered without Gemini; misses run
+    concurrently through the shared async client (bounded concurrency)
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list of {type, topic}'}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items per batch'}), 400
+
+        results = [None] * len(items)
+        unique = {}  # cache key -> (prompt, content type, topic, [item indexes])
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                item = {}
+            content_type = str(item.get('type') or '').strip().lower()
+            topic = str(item.get('topic') or '').strip()
+            if content_type not in BATCH_CONTENT_TYPES:
+                results[index] = {'success': False, 'error': f'Unknown type: {content_type or None}'}
+                continue
+            if not topic:
+                results[index] = {'success': False, 'type': content_type, 'error': 'Topic is required'}
+                continue
+            results[index] = {'type': content_type, 'topic': topic}
+            prompt = generate_prompt(content_type, topic)
+            key = cache_key(prompt, {'model': MODEL_NAME, **GENERATION_CONFIG})
+            unique.setdefault(key, (prompt, content_type, topic, []))[3].append(index)
+
+        texts = {}
+        misses = []
+        for key in unique:
+            with stage('cache_lookup', 'batch'):
+                cached = request_cache.get(key)
+            if cached is not None:
+                texts[key] = cached
+            else:
+                misses.append(key)
+        logger.info(f"Batch of {len(items)} items: {len(unique)} unique, {len(misses)} to generate")
+
+        errors = {}
+        if misses:
+            generated, errors = generate_many([(key,) + unique[key][:3] for key in misses])
+            texts.update(generated)
+
+        for key, (_, _, _, indexes) in unique.items():
+            for index in indexes:
+                if key in texts:
+                    results[index].update(success=True, content=texts[key], cached=key not in misses)
+                else:
+                    results[index].update(success=False, error=f'Failed to generate content: {errors[key]}')
+
+        failed = sum(1 for r in results if not r['success'])
+        with stage('serialization', 'batch'):
+            return jsonify({
+                'success': failed == 0,
+                'results': results,
+                'stats': {
+                    'items': len(items),
+                    'unique': len(unique),
+                    'cached': len(unique) - len(misses),
+                    'generated': len(misses) - len(errors),
+                    'failed': failed
+                }
+            }), 200
+
+    except Exception as e:
+        logger.error(f"Error generating batch: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to generate batch: {str(e)}'
+        }), 500
+
+
+# Follow-up requests for missing questions before returning a partial quiz
+PRESESSION_TOPUP_ROUNDS = 2
+
+
+def generate_structured_presession_quiz(strengths, weaknesses):
+    """
+    Generate and parse a pre-session quiz into question dicts
+    Missing or malformed questions are re-requested on their own instead of
+    regenerating all 20; complete results are cached in parsed form
+    """
+    with stage('prompt_build', 'presession_quiz'):
+        prompt = build_presession_prompt(strengths, weaknesses)
+    key = cache_key(prompt, {'model': MODEL_NAME, **GENERATION_CONFIG, 'format': 'parsed'})
+    cached = request_cache.get(key)
+    if cached is None:
+        cached = _persistent_get(key, 'presession_quiz')
+    if cached is not None:
+        logger.info("Returning cached parsed quiz")
+        return json.loads(cached)
+
+    text = safe_generate_content(prompt, content_type='presession_quiz').text
+    with stage('parse', 'presession_quiz'):
+        questions = parse_quiz(text)
+    parts = [text]
+
+    for _ in range(PRESESSION_TOPUP_ROUNDS):
+        missing = missing_questions(questions)
+        if not missing:
+            break
+        logger.info(f"Re-requesting {len(missing)} missing quiz questions: {missing}")
+        topup_prompt = build_presession_topup_prompt(strengths, weaknesses, missing)
+        # A top-up that leaves numbers missing is not cached, so the next
+        # request for this quiz asks Gemini again instead of replaying it
+        topup = safe_generate_content(
+            topup_prompt, content_type='presession_quiz',
+            cache_if=lambda text, wanted=missing: set(wanted) <= set(parse_quiz(text))).text
+        for number, question in parse_quiz(topup).items():
+            if number in missing:
+                questions[number] = question
+        parts.append(topup)
+
+    result = {
+        'questions': [questions[n] for n in sorted(questions)],
+        'content': '\n\n'.join(parts),
+        'complete': not missing_questions(questions)
+    }
+    if result['complete']:
+        _cache_store(key, json.dumps(result), 'presession_quiz')
+        _bank_full_quiz(strengths, weaknesses, result['questions'])
+    return result
+
+
+def _bank_full_quiz(strengths, weaknesses, questions):
+    """Keep questions from a full generation whose subject is unambiguous"""
+    if question_bank is None:
+        return
+    try:
+        for subjects, category in ((strengths, 'STRENGTH'), (weaknesses, 'WEAKNESS')):
+            if len(subjects) == 1:
+                question_bank.add(subjects[0], category,
+                                  [q for q in questions if q['category'] == category])
+    except Exception as e:
+        logger.warning(f"Question bank write failed: {str(e)}")
+
+
+# Minimum questions requested when a bank subject runs low
+BANK_TOPUP_BATCH = 10
+
+
+def assemble_presession_quiz(strengths, weaknesses, user_id=None):
+    """
+    Build a pre-session quiz from the question bank
+    Subjects without enough questions unused by this user are topped up with
+    one Gemini call each (in parallel); a failed top-up only affects its own
+    subject, which falls back to questions the user has seen before
+    Returns None when there is nothing to ask; raises the top-up error if the
+    bank is empty and every top-up failed
+    """
+    slots = allocate_slots(strengths, weaknesses)
+    if not slots:
+        return None
+
+    shortfalls = [(subject, category, count - question_bank.available(subject, category, user_id))
+                  for subject, category, count in slots]
+    topups = [(subject, category,
+               gemini_client.submit(build_bank_topup_prompt(subject, category, max(short, BANK_TOPUP_BATCH))))
+              for subject, category, short in shortfalls if short > 0]
+    errors = []
+    for subject, category, future in topups:
+        logger.info(f"Topping up question bank: {subject} ({category})")
+        try:
+            questions = parse_quiz(gemini_client.result(future)).values()
+        except Exception as e:
+            logger.warning(f"Question bank top-up failed for {subject}: {str(e)}")
+            errors.append(e)
+            continue
+        question_bank.add(subject, category, questions)
+
+    # All slots are picked (and marked served) together, only once the quiz is final
+    questions = [q for group in question_bank.pick_slots(slots, user_id) for q in group]
+    if not questions:
+        if errors:
+            raise errors[0]
+        return None
+
+    for number, q in enumerate(questions, 1):
+        q['number'] = number
+        q['difficulty'] = f"[{q['category']} - {q['level']}]" if q.get('level') else f"[{q['category']}]"
+
+    question_bank.assembled += 1
+    return {
+        'questions': questions,
+        'content': '\n\n'.join(format_question(q) for q in questions),
+        'complete': len(questions) == sum(count for _, _, count in slots),
+        'source': 'bank' if not topups else 'bank+topup'
+    }
 
 
 @app.route('/generate-presession-quiz', methods=['POST', 'OPTIONS'])
 def generate_presession_quiz():
     """Generate personalized pre-session quiz with robust error handling"""
     if request.method == 'OPTIONS':
-        response = make_response('', 200)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        return response
+        return '', 200
 
     try:
         data = request.get_json()
@@ -291,55 +892,195 @@ def generate_presession_quiz():
             f"Generating pre-session quiz (strengths: {len(strengths)}, weaknesses: {len(weaknesses)})"
         )
 
-        strengths_text = ', '.join(strengths) if strengths else 'None specified'
-        weaknesses_text = ', '.join(weaknesses) if weaknesses else 'None specified'
+        with stage('prompt_build', 'presession_quiz'):
+            prompt = build_presession_prompt(strengths, weaknesses)
 
-        prompt = f"""You MUST create EXACTLY 20 questions. Not 5, not 10, but TWENTY (20) questions total.
+        if wants_stream(data):
+            return stream_generation(prompt, 'presession_quiz', split_questions=True)
 
-STUDENT: Strengths: {strengths_text} | Weaknesses: {weaknesses_text}
+        user_id = data.get('userId')
 
-MANDATORY: Generate questions 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, and 20.
-
-FORMAT for EVERY question:
-Question [N] [STRENGTH/WEAKNESS - DIFFICULTY]
-[Question text]?
-A) [Option]
-B) [Option]
-C) [Option]
-D) [Option]
-Correct Answer: [A/B/C/D]
-Explanation: [Brief explanation]
-
-Questions 1-10: STRENGTHS ({strengths_text}) - challenging
-Questions 11-20: WEAKNESSES ({weaknesses_text}) - easier
+        def generate():
+            quiz = None
+            if question_bank is not None:
+                # Only a broken bank falls back to a full generation; Gemini
+                # errors from top-ups are not retried as a second, larger call
+                try:
+                    quiz = assemble_presession_quiz(strengths, weaknesses, user_id)
+                except sqlite3.Error as e:
+                    logger.warning(f"Question bank assembly failed: {str(e)}")
+            if quiz is None:
+                quiz = generate_structured_presession_quiz(strengths, weaknesses)
 
-GENERATE ALL 20 NOW - DO NOT STOP UNTIL YOU REACH QUESTION 20:"""
+            logger.info(f"Successfully generated pre-session quiz ({len(quiz['questions'])} questions)")
+            return {
+                'success': True,
+                'content': quiz['content'],
+                'questions': quiz['questions'],
+                'complete': quiz['complete'],
+                'source': quiz.get('source', 'generated')
+            }
 
-        response = safe_generate_content(prompt)
-        response_text = response.text if hasattr(response, 'text') else str(response)
+        if wants_async(data):
+            return submit_job('presession_quiz', generate, data)
 
-        logger.info("Successfully generated pre-session quiz")
-        response = make_response(jsonify({
-            'success': True,
-            'content': response_text
-        }), 200)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        return response
+        body = generate()
+        with stage('serialization', 'presession_quiz'):
+            return jsonify(body), 200
 
     except Exception as e:
         logger.error(
             f"Error generating pre-session quiz: {str(e)}\n{traceback.format_exc()}"
         )
-        response = make_response(jsonify({
+        return jsonify({
             'success': False,
             'error': f'Failed to generate quiz: {str(e)}'
-        }), 500)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        return response
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job status and result; ?wait=N long-polls up to N seconds for completion"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_MAX_POLL_WAIT)
+    except ValueError:
+        wait = 0
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.snapshot(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    return jsonify(dict(job, success=job['status'] != 'failed')), 200
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events for a job: status now, then done or error"""
+    job = job_queue.snapshot(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+
+    def events():
+        current = job
+        yield sse_event('status', {'jobId': job_id, 'status': current['status']})
+        while current['status'] not in FINISHED:
+            current = job_queue.wait(job_id, 15)
+            if current is None:
+                yield sse_event('error', {'success': False, 'error': 'Unknown or expired job'})
+                return
+            if current['status'] not in FINISHED:
+                # Comment lines keep proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+        if current['status'] == 'done':
+            yield sse_event('done', current['result'])
+        else:
+            yield sse_event('error', {'success': False, 'error': f"Failed to generate content: {current['error']}",
+                                      'interrupted': current.get('interrupted', False)})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/matches/profiles', methods=['POST', 'OPTIONS'])
+def upsert_match_profiles():
+    """Add or update profiles in the server-side match index"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        match_index.sync()
+        profiles = data.get('profiles', [data])
+        updated = []
+        for profile in profiles:
+            user_id = profile_id(profile)
+            if user_id is None:
+                return jsonify({'error': 'Each profile needs an id or username'}), 400
+            match_index.upsert(user_id, profile)
+            updated.append(user_id)
+
+        logger.info(f"Indexed {len(updated)} profile(s) ({len(match_index)} total)")
+        return jsonify({'success': True, 'updated': updated, 'total': len(match_index)}), 200
+
+    except Exception as e:
+        logger.error(f"Error indexing profiles: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'success': False, 'error': f'Failed to index profiles: {str(e)}'}), 500
+
+
+@app.route('/matches/reject', methods=['POST', 'OPTIONS'])
+def reject_match():
+    """Hide rejected users from a user's matches (or clear them with {"clear": true})"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        user_id = data.get('userId')
+        if user_id is None:
+            return jsonify({'error': 'userId is required'}), 400
+
+        match_index.sync()
+        if data.get('clear'):
+            match_index.clear_rejections(user_id)
+            rejected = []
+        else:
+            rejected = data.get('rejectedIds') or [data.get('rejectedId')]
+            if any(r is None for r in rejected):
+                return jsonify({'error': 'rejectedId or rejectedIds is required'}), 400
+            for rejected_id in rejected:
+                match_index.reject(user_id, rejected_id)
+
+        logger.info(f"Recorded {len(rejected)} rejection(s) for {user_id}")
+        return jsonify({'success': True, 'userId': user_id,
+                        'rejected': sorted(map(str, match_index.rejected_ids(user_id)))}), 200
+
+    except Exception as e:
+        logger.error(f"Error recording rejection: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'success': False, 'error': f'Failed to record rejection: {str(e)}'}), 500
+
+
+@app.route('/matches/top', methods=['POST', 'OPTIONS'])
+def top_matches():
+    """Top-K matches for a user, scoring only candidates with a complementary skill"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        user_id = data.get('userId')
+        try:
+            k = int(data.get('k', 10))
+        except (TypeError, ValueError):
+            k = 0
+        if not 0 < k <= 100:
+            return jsonify({'error': 'k must be an integer from 1 to 100'}), 400
+        excluded = data.get('excludedIds', [])
+
+        match_index.sync()
+        if data.get('profile'):
+            profile = normalize_profile(data['profile'])
+            if user_id is None:
+                user_id = profile_id(data['profile'])
+        elif user_id in match_index:
+            # Indexed users read their materialized top-K row
+            matches = match_index.matches(user_id, k=k, exclude=excluded)
+            return jsonify({'success': True, 'userId': user_id, 'matches': matches}), 200
+        else:
+            return jsonify({'error': 'Unknown userId and no profile provided'}), 404
+
+        matches = match_index.top_matches(profile, k=k, user_id=user_id, exclude=excluded)
+        return jsonify({'success': True, 'userId': user_id, 'matches': matches}), 200
+
+    except Exception as e:
+        logger.error(f"Error finding matches: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'success': False, 'error': f'Failed to find matches: {str(e)}'}), 500
+
 
 if __name__ == '__main__':
     import sys
@@ -354,10 +1095,11 @@ if __name__ == '__main__':
     logger.info("=" * 50)
     logger.info("PeerFuse Backend Server - Production Mode")
     logger.info("=" * 50)
-    logger.info(f"Gemini API: {'Configured' if GEMINI_API_KEY else 'NOT CONFIGURED'}")
-    logger.info("Model: models/gemini-2.5-flash")
+    logger.info(f"LLM provider: {llm_provider.name} ({'Configured' if llm_provider.configured else 'NOT CONFIGURED'})")
+    logger.info(f"Model: {MODEL_NAME}")
     logger.info("Server: http://127.0.0.1:5000")
     logger.info("Endpoints: /health, /generate-notes, /generate-flashcards, /generate-quiz, /generate-presession-quiz")
+    logger.info("Matching: /matches/profiles, /matches/top, /matches/reject")
     logger.info("=" * 50)
     logger.info("Server is running - Keep this terminal open!")
     logger.info("=" * 50)
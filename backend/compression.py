@@ -0,0 +1,134 @@
+"""
+PeerFuse Response Compression
+Accept-Encoding negotiation (brotli when installed, else gzip), ETags for
+conditional requests, and an LRU of compressed bodies so repeated responses
+for a cached generation are not compressed again
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+# Bodies smaller than this are sent as is (headers would eat the saving)
+COMPRESS_MIN_BYTES = 1024
+
+# Level 6 / quality 5 keep compression of a ~30KB generation around a millisecond
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Best supported coding from an Accept-Encoding header, or None for identity"""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    best = None
+    for coding in SUPPORTED_ENCODINGS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return best[0] if best else None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def etag_for(data):
+    """
+    Weak validator over the uncompressed body, so every encoding of the same
+    content shares one ETag
+    """
+    return 'W/"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check with weak comparison (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class CompressedBodyCache:
+    """
+    Thread-safe LRU of compressed bodies keyed by (ETag, encoding), bounded by bytes
+    A body repeated for the same cached generation is compressed once
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (etag, encoding) -> compressed bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get_or_compress(self, etag, encoding, data):
+        key = (etag, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.bytes_in += len(data)
+                self.bytes_out += len(body)
+                return body
+            self.misses += 1
+
+        body = compress(data, encoding)
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(body)
+            if len(body) <= self.max_bytes and key not in self._entries:
+                self._entries[key] = body
+                self._bytes += len(body)
+                while self._bytes > self.max_bytes:
+                    _, oldest = self._entries.popitem(last=False)
+                    self._bytes -= len(oldest)
+        return body
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'encodings': list(SUPPORTED_ENCODINGS),
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 0.0
+            }
@@ -0,0 +1,281 @@
+"""
+PeerFuse Async Gemini Client
+Runs Gemini calls on a background asyncio loop with bounded concurrency
+Request threads only wait on a future; quota waits and retries use asyncio.sleep
+The model is resolved on the calling thread, so a slow warm-up never blocks the loop
+The app itself stays WSGI (Flask under gunicorn gthread); only the Gemini I/O is
+async, so every wait on it from a request thread is bounded by GEMINI_CALL_TIMEOUT
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from metrics import GEMINI_OUTPUT_CHARS, GEMINI_RETRIES, GEMINI_SECONDS, stage
+from rate_limiter import RateLimitExceeded, estimate_tokens, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Max Gemini calls in flight at once (per process)
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+
+# Longest a request thread waits for one generation, retries and quota waits
+# included (seconds); kept under gunicorn's --timeout 300 so a stuck call fails
+# the request instead of getting the worker killed
+GEMINI_CALL_TIMEOUT = float(os.getenv('GEMINI_CALL_TIMEOUT', '240'))
+
+# Marks the end of a streamed generation in the chunk queue
+_STREAM_END = object()
+
+
+class GenerationTimeout(TimeoutError):
+    """A generation did not finish within the call timeout (it is cancelled)"""
+
+
+def extract_text(response):
+    """Robust text extraction from a Gemini response"""
+    text = ""
+
+    if hasattr(response, 'text') and response.text:
+        text = response.text.strip()
+
+    elif hasattr(response, 'candidates') and response.candidates:
+        try:
+            text = response.candidates[0].content.parts[0].text.strip()
+        except Exception:
+            text = ""
+
+    if not text:
+        raise Exception("Gemini returned empty output")
+    return text
+
+
+def is_rate_limit_error(error):
+    if getattr(error, 'code', None) == 429 or type(error).__name__ == 'ResourceExhausted':
+        return True
+    error_str = str(error)
+    return '429' in error_str or 'rate limit' in error_str.lower()
+
+
+class AsyncGeminiClient:
+    """
+    Event-loop driven Gemini client shared by all request threads
+    The loop thread is started lazily so it is created after gunicorn forks
+    """
+
+    def __init__(self, get_model, max_concurrency=GEMINI_MAX_CONCURRENCY, max_retries=3, limiter=None,
+                 call_timeout=GEMINI_CALL_TIMEOUT):
+        self.get_model = get_model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.call_timeout = call_timeout
+        self.limiter = limiter
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='gemini-loop', daemon=True).start()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._loop = loop
+                logger.info(f"Gemini event loop started (max concurrency {self.max_concurrency})")
+        return self._loop
+
+    def submit(self, prompt, max_retries=None):
+        """
+        Schedule a generation; returns a concurrent.futures.Future of the text
+        Waiting for the model (provider warm-up) happens here on the caller's
+        thread; if it is unavailable the future fails without a retry or quota use
+        """
+        try:
+            model = self.get_model()
+        except Exception as e:
+            failed = Future()
+            failed.set_exception(e)
+            return failed
+        loop = self._ensure_loop()
+        coro = self._generate(model, prompt, max_retries or self.max_retries)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def result(self, future, timeout=None):
+        """
+        Text of a submitted generation, waiting at most timeout (default
+        call_timeout) seconds; on timeout the generation is cancelled
+        """
+        timeout = self.call_timeout if timeout is None else timeout
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise GenerationTimeout(f"Gemini call timed out after {timeout:g}s")
+
+    def generate(self, prompt, max_retries=None, timeout=None):
+        """Blocking helper for request threads"""
+        return self.result(self.submit(prompt, max_retries), timeout)
+
+    def generate_many(self, prompts, max_retries=None, timeout=None):
+        """
+        Run several generations as one gather on the event loop (each still
+        takes a concurrency slot); blocks for all of them, bounded by timeout
+        Returns a list with the text or the exception of each prompt
+        """
+        model = self.get_model()
+        loop = self._ensure_loop()
+        retries = max_retries or self.max_retries
+
+        async def gather():
+            return await asyncio.gather(*(self._generate(model, prompt, retries) for prompt in prompts),
+                                        return_exceptions=True)
+
+        return self.result(asyncio.run_coroutine_threadsafe(gather(), loop), timeout)
+
+    def stream(self, prompt, max_retries=None):
+        """
+        Blocking generator of text chunks as Gemini produces them
+        Upstream errors are re-raised after the last chunk; the whole stream
+        is bounded by call_timeout
+        """
+        model = self.get_model()
+        loop = self._ensure_loop()
+        chunks = queue.Queue()
+        coro = self._stream(model, prompt, max_retries or self.max_retries, chunks)
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        deadline = time.monotonic() + self.call_timeout
+        while True:
+            try:
+                chunk = chunks.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                future.cancel()
+                raise GenerationTimeout(f"Gemini stream timed out after {self.call_timeout:g}s")
+            if chunk is _STREAM_END:
+                break
+            yield chunk
+        future.result()
+
+    async def _stream(self, model, prompt, max_retries, chunks):
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    await self._stream_with_retries(model, prompt, max_retries, chunks)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            chunks.put(_STREAM_END)
+
+    async def _acquire(self, prompt):
+        if self.limiter is None:
+            return 0
+        with stage('rate_limit_wait'):
+            return await self.limiter.acquire(estimate_tokens(prompt))
+
+    async def _backoff(self, error, attempt):
+        """Wait before retrying a rate-limited call"""
+        if self.limiter is not None:
+            # The limiter pauses every caller; the next acquire waits it out
+            self.limiter.record_rate_limited(retry_after_seconds(error))
+            return
+        wait_time = retry_after_seconds(error) or 2 ** attempt
+        logger.info(f"Rate limited. Waiting {wait_time}s before retry...")
+        await asyncio.sleep(wait_time)
+
+    async def _stream_with_retries(self, m, prompt, max_retries, chunks):
+        for attempt in range(max_retries):
+            emitted = False
+            start = None
+            try:
+                estimate = await self._acquire(prompt)
+                start = time.perf_counter()
+                response = await m.generate_content_async(prompt, stream=True)
+                usage = None
+                size = 0
+                async for chunk in response:
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    text = chunk.text
+                    if text:
+                        emitted = True
+                        size += len(text)
+                        chunks.put(text)
+                if not emitted:
+                    raise Exception("Gemini returned empty output")
+                GEMINI_SECONDS.observe(time.perf_counter() - start, mode='stream', outcome='ok')
+                GEMINI_OUTPUT_CHARS.observe(size, mode='stream')
+                if self.limiter is not None:
+                    self.limiter.record_success(estimate, usage)
+                return
+
+            except RateLimitExceeded:
+                raise
+
+            except Exception as e:
+                logger.warning(f"Stream attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+                if start is not None:
+                    GEMINI_SECONDS.observe(time.perf_counter() - start, mode='stream',
+                                           outcome='rate_limited' if is_rate_limit_error(e) else 'error')
+
+                # Once text has reached the client a retry would duplicate it
+                if emitted or attempt == max_retries - 1:
+                    if is_rate_limit_error(e) and self.limiter is not None:
+                        self.limiter.record_rate_limited(retry_after_seconds(e))
+                    raise
+
+                GEMINI_RETRIES.inc(reason='rate_limit' if is_rate_limit_error(e) else 'error')
+                if is_rate_limit_error(e):
+                    await self._backoff(e, attempt)
+
+    async def _generate(self, model, prompt, max_retries):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await self._generate_with_retries(model, prompt, max_retries)
+            finally:
+                self.in_flight -= 1
+
+    async def _generate_with_retries(self, m, prompt, max_retries):
+        for attempt in range(max_retries):
+            try:
+                # Queue for RPM/TPM quota before sending (bounded wait)
+                estimate = await self._acquire(prompt)
+                start = time.perf_counter()
+                try:
+                    response = await m.generate_content_async(prompt)
+                except Exception as e:
+                    GEMINI_SECONDS.observe(time.perf_counter() - start, mode='generate',
+                                           outcome='rate_limited' if is_rate_limit_error(e) else 'error')
+                    raise
+                GEMINI_SECONDS.observe(time.perf_counter() - start, mode='generate', outcome='ok')
+                with stage('extract'):
+                    text = extract_text(response)
+                GEMINI_OUTPUT_CHARS.observe(len(text), mode='generate')
+                if self.limiter is not None:
+                    self.limiter.record_success(estimate, getattr(response, 'usage_metadata', None))
+                return text
+
+            except RateLimitExceeded:
+                raise
+
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+                rate_limited = is_rate_limit_error(e)
+                if attempt < max_retries - 1:
+                    GEMINI_RETRIES.inc(reason='rate_limit' if rate_limited else 'error')
+
+                if rate_limited and attempt < max_retries - 1:
+                    # Non-blocking: other generations keep running meanwhile
+                    await self._backoff(e, attempt)
+                    continue
+
+                if attempt == max_retries - 1:
+                    if is_rate_limit_error(e) and self.limiter is not None:
+                        self.limiter.record_rate_limited(retry_after_seconds(e))
+                    raise
+
+        raise Exception("Failed after maximum retries")
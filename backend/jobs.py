@@ -0,0 +1,287 @@
+"""
+PeerFuse Job Queue
+In-process priority queue for long generations
+Requests get a job id immediately; worker threads run jobs independently of
+the HTTP connection, so they finish even if the client disconnects
+Job records are mirrored to SQLite (JobStore) so any worker can answer a
+status poll, and jobs lost with a recycled worker report as interrupted
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: interactive requests jump ahead of bulk generation
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '200'))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '3600'))  # seconds finished jobs stay pollable
+
+# How often a poll for a job owned by another worker re-reads its record (seconds)
+JOB_POLL_INTERVAL = 0.5
+
+FINISHED = ('done', 'failed')
+INTERRUPTED_ERROR = 'Job was interrupted by a server restart, please retry'
+
+
+class QueueFull(Exception):
+    """Too many jobs are already waiting"""
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'priority', 'fn', 'status', 'result', 'error',
+                 'created_at', 'started_at', 'finished_at', 'done')
+
+    def __init__(self, kind, priority, fn):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.fn = fn
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return record_to_dict({
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        })
+
+
+def record_to_dict(record):
+    """API shape of a job record (a Job's fields or a JobStore row)"""
+    data = {
+        'jobId': record['id'],
+        'kind': record['kind'],
+        'status': record['status'],
+        'createdAt': record['created_at'],
+        'startedAt': record['started_at'],
+        'finishedAt': record['finished_at']
+    }
+    if record['status'] == 'done':
+        data['result'] = record['result']
+    elif record['status'] == 'failed':
+        data['error'] = record['error']
+        if record.get('interrupted'):
+            data['interrupted'] = True
+    return data
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore(SQLiteStore):
+    """
+    Job records in SQLite, shared by gunicorn workers and kept across recycling
+    Each row names the pid of the worker running it; an unfinished job whose
+    worker is gone can never finish and reads as failed with interrupted set
+    """
+
+    _COLUMNS = ('id', 'kind', 'status', 'result', 'error', 'pid',
+                'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+                " result TEXT, error TEXT, pid INTEGER NOT NULL, created_at REAL NOT NULL,"
+                " started_at REAL, finished_at REAL)"
+            )
+
+    def save(self, job):
+        result = json.dumps(job.result) if job.status == 'done' else None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, status, result, error, pid,"
+                " created_at, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.status, result, job.error, os.getpid(),
+                 job.created_at, job.started_at, job.finished_at)
+            )
+
+    def load(self, job_id):
+        """Record dict for a job, or None if unknown"""
+        row = self._connect().execute(
+            "SELECT " + ", ".join(self._COLUMNS) + " FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(self._COLUMNS, row))
+        if record['result'] is not None:
+            record['result'] = json.loads(record['result'])
+        if record['status'] not in FINISHED and not _process_alive(record['pid']):
+            record.update(status='failed', error=INTERRUPTED_ERROR, interrupted=True)
+        return record
+
+    def prune(self, cutoff):
+        """Drop jobs that finished (or, if never finished, were created) before cutoff"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE COALESCE(finished_at, created_at) < ?", (cutoff,))
+
+
+class JobQueue:
+    """
+    Priority queue drained by a fixed pool of worker threads
+    Workers start lazily so they are created after gunicorn forks
+    With a JobStore, every state change is also written there and status
+    lookups for jobs this process does not hold fall back to it
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, result_ttl=JOB_RESULT_TTL, store=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.store = store
+        self._store_pruned_at = 0.0
+        self._heap = []  # (priority, seq, job)
+        self._seq = itertools.count()
+        self._jobs = {}  # job id -> Job
+        self._cond = threading.Condition()
+        self._started = False
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, kind, fn, priority='normal'):
+        """Queue fn(); returns the Job (raises QueueFull when saturated)"""
+        job = Job(kind, PRIORITIES.get(priority, PRIORITIES['normal']), fn)
+        with self._cond:
+            self._prune()
+            if len(self._heap) >= self.max_queued:
+                raise QueueFull(f"{len(self._heap)} jobs already queued")
+            if not self._started:
+                for i in range(self.workers):
+                    threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+                self._started = True
+                logger.info(f"Job workers started ({self.workers})")
+            self._jobs[job.id] = job
+            # Recorded before a worker can see it, so 'queued' never overwrites 'running'
+            self._persist(job)
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """Job status dict (Job.to_dict shape) from this process or the store; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        record = self._load(job_id)
+        return record_to_dict(record) if record is not None else None
+
+    def wait(self, job_id, timeout):
+        """
+        Like snapshot(), after waiting up to timeout seconds for the job to finish
+        Jobs held by another worker are polled from the store every JOB_POLL_INTERVAL
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+            return job.to_dict()
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self._load(job_id)
+            if record is None:
+                return None
+            remaining = deadline - time.monotonic()
+            if record['status'] in FINISHED or remaining <= 0:
+                return record_to_dict(record)
+            time.sleep(min(JOB_POLL_INTERVAL, remaining))
+
+    def _persist(self, job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except Exception as e:
+            logger.warning(f"Could not record job {job.id}: {str(e)}")
+
+    def _load(self, job_id):
+        if self.store is None:
+            return None
+        try:
+            return self.store.load(job_id)
+        except Exception as e:
+            logger.warning(f"Could not read job {job_id}: {str(e)}")
+            return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                job.status = 'running'
+                job.started_at = time.time()
+            self._persist(job)
+
+            try:
+                job.result = job.fn()
+                job.status = 'done'
+                self.completed += 1
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+                job.error = str(e)
+                job.status = 'failed'
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                job.fn = None
+                self._persist(job)
+                job.done.set()
+
+    def _prune(self):
+        """Forget finished jobs past their TTL (caller holds the lock)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None and time.time() - self._store_pruned_at >= 60:
+            self._store_pruned_at = time.time()
+            try:
+                self.store.prune(cutoff)
+            except Exception as e:
+                logger.warning(f"Could not prune job records: {str(e)}")
+
+    def stats(self):
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return {
+                'workers': self.workers,
+                'queued': len(self._heap),
+                'running': running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retained': len(self._jobs)
+            }
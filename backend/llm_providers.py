@@ -0,0 +1,415 @@
+"""
+PeerFuse LLM Providers
+Model backends behind the async client: Gemini, or a local deterministic stub
+The stub returns correctly formatted content after configurable latency and
+error rates, so throughput, caching and backoff can be tested offline; the
+replay provider serves responses recorded from Gemini with LLM_RECORD_PATH
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# Stub behaviour (LLM_PROVIDER=stub)
+STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', '800'))
+STUB_JITTER_MS = float(os.getenv('STUB_JITTER_MS', '200'))
+STUB_ERROR_RATE = float(os.getenv('STUB_ERROR_RATE', '0'))
+STUB_RATE_LIMIT_RATE = float(os.getenv('STUB_RATE_LIMIT_RATE', '0'))
+STUB_STREAM_CHUNKS = int(os.getenv('STUB_STREAM_CHUNKS', '8'))
+
+# Longest a request waits for the Gemini warm-up before failing (seconds)
+WARM_UP_WAIT = float(os.getenv('GEMINI_WARM_UP_WAIT', '60'))
+
+# Recorded responses: Gemini appends to LLM_RECORD_PATH, LLM_PROVIDER=replay reads LLM_REPLAY_PATH
+LLM_RECORD_PATH = os.getenv('LLM_RECORD_PATH')
+LLM_REPLAY_PATH = os.getenv('LLM_REPLAY_PATH', 'llm_recordings.jsonl')
+
+
+class ModelUnavailable(RuntimeError):
+    """Provider not configured or warm-up unfinished/failed (retrying will not help)"""
+
+
+def prompt_digest(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+
+class GeminiProvider:
+    """
+    Google Gemini via google-generativeai
+    The SDK import, configure() and model construction run in a background
+    warm-up thread, so the server answers /health while the heavy import runs
+    """
+
+    name = 'gemini'
+
+    def __init__(self, model_name, generation_config):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+        self.configured = bool(self.api_key)
+        self.stage = 'pending'
+        self.error = None
+        self.timings = {}
+        self._genai = None
+        self._model = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        if not self.api_key:
+            logger.error("GEMINI_API_KEY not found in environment variables")
+            self.stage = 'missing_key'
+            self.error = "GEMINI_API_KEY not found"
+            self._ready.set()
+            return
+
+        # Log first/last 4 chars of key for debugging (safe to log)
+        logger.info(f"Using API key: {self.api_key[:8]}...{self.api_key[-4:]}")
+
+    def start_warm_up(self):
+        """Start the warm-up thread once per process (threads do not survive a fork)"""
+        with self._lock:
+            if self._ready.is_set() or (self._thread is not None and self._pid == os.getpid()):
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._warm_up, name='gemini-warm-up', daemon=True)
+            self._thread.start()
+
+    def _warm_up(self):
+        started = time.perf_counter()
+        try:
+            self.stage = 'importing'
+            t = time.perf_counter()
+            import google.generativeai as genai
+            self.timings['import_seconds'] = round(time.perf_counter() - t, 3)
+
+            self.stage = 'configuring'
+            t = time.perf_counter()
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+            self._model = genai.GenerativeModel(
+                self.model_name,
+                generation_config=self.generation_config
+            )
+            self.timings['configure_seconds'] = round(time.perf_counter() - t, 3)
+
+            self.stage = 'ready'
+            logger.info(f"Gemini warm-up finished in {time.perf_counter() - started:.2f}s "
+                        f"(SDK import {self.timings['import_seconds']:.2f}s)")
+        except Exception as e:
+            self.stage = 'failed'
+            self.error = str(e)
+            logger.error(f"Failed to configure Gemini API: {str(e)}")
+        finally:
+            self.timings['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+            self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        self.start_warm_up()
+        return self._ready.wait(timeout)
+
+    def _require(self):
+        if not self.configured:
+            raise ModelUnavailable(
+                "GEMINI_API_KEY not found! Please set it in backend/.env file.\n"
+                "Get your API key from: https://makersuite.google.com/app/apikey"
+            )
+        if not self.wait_ready(WARM_UP_WAIT):
+            raise ModelUnavailable(f"Gemini client still warming up (stage: {self.stage})")
+        if self.stage != 'ready':
+            raise ModelUnavailable(f"Gemini client unavailable: {self.error}")
+
+    def get_model(self):
+        """Model built by the warm-up (waits for it on the first requests)"""
+        self._require()
+        return self._model
+
+    def list_models(self):
+        self._require()
+        return [m.name for m in self._genai.list_models()
+                if 'generateContent' in m.supported_generation_methods]
+
+    def readiness(self):
+        return {'ready': self.stage == 'ready', 'stage': self.stage, 'error': self.error, **self.timings}
+
+
+class StubUsage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class StubResponse:
+    """Quacks like a google-generativeai response (text + usage_metadata)"""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.candidates = []
+        self.usage_metadata = usage
+
+
+class StubStream:
+    """Async iterator over response chunks with the latency spread between them"""
+
+    def __init__(self, chunks, delay):
+        self._chunks = iter(chunks)
+        self._delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        return chunk
+
+
+class StubModel:
+    def __init__(self, provider):
+        self.provider = provider
+
+    async def generate_content_async(self, prompt, stream=False):
+        p = self.provider
+        p.calls += 1
+        rng = p._rng
+        latency = max(0.0, p.latency_ms + rng.uniform(-p.jitter_ms, p.jitter_ms)) / 1000
+
+        roll = rng.random()
+        if roll < p.rate_limit_rate:
+            await asyncio.sleep(min(latency, 0.05))
+            raise Exception("429 Resource has been exhausted (stub). Please retry in 1s")
+        if roll < p.rate_limit_rate + p.error_rate:
+            await asyncio.sleep(latency)
+            raise Exception("500 Internal error (stub)")
+
+        text = p.content(prompt)
+        usage = StubUsage(prompt, text)
+        if not stream:
+            await asyncio.sleep(latency)
+            return StubResponse(text, usage)
+
+        # Split on line boundaries so question blocks arrive over several chunks
+        lines = text.splitlines(keepends=True)
+        size = max(1, -(-len(lines) // p.stream_chunks))
+        pieces = [''.join(lines[i:i + size]) for i in range(0, len(lines), size)]
+        chunks = [StubResponse(piece) for piece in pieces]
+        chunks[-1].usage_metadata = usage
+        return StubStream(chunks, latency / len(chunks))
+
+
+class StubProvider:
+    """Offline provider for load tests; output depends only on the prompt"""
+
+    name = 'stub'
+    model_name = 'stub'
+    configured = True
+
+    def __init__(self, latency_ms=STUB_LATENCY_MS, jitter_ms=STUB_JITTER_MS, error_rate=STUB_ERROR_RATE,
+                 rate_limit_rate=STUB_RATE_LIMIT_RATE, stream_chunks=STUB_STREAM_CHUNKS, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._model = StubModel(self)
+        logger.info(f"Using stub LLM provider ({latency_ms:.0f}±{jitter_ms:.0f}ms, "
+                    f"{error_rate:.0%} errors, {rate_limit_rate:.0%} rate limits)")
+
+    def start_warm_up(self):
+        pass
+
+    def readiness(self):
+        return {'ready': True, 'stage': 'ready', 'error': None}
+
+    def content(self, prompt):
+        return stub_content(prompt)
+
+    def get_model(self):
+        return self._model
+
+    def list_models(self):
+        return [self.model_name]
+
+
+class ReplayProvider(StubProvider):
+    """
+    Serves recorded Gemini responses (JSON lines of {"prompt", "text"}) with
+    stub latency and error rates; unrecorded prompts fall back to stub content
+    """
+
+    name = 'replay'
+    model_name = 'replay'
+
+    def __init__(self, path=LLM_REPLAY_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.recordings = {}
+        self.replayed = 0
+        self.fallbacks = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recordings[prompt_digest(entry['prompt'])] = entry['text']
+        logger.info(f"Replaying {len(self.recordings)} recorded responses from {path}")
+
+    def content(self, prompt):
+        text = self.recordings.get(prompt_digest(prompt))
+        if text is None:
+            self.fallbacks += 1
+            return stub_content(prompt)
+        self.replayed += 1
+        return text
+
+
+class RecordingModel:
+    """Wraps a Gemini model and appends non-streamed responses to a JSON lines file"""
+
+    def __init__(self, model, path, lock):
+        self.model = model
+        self.path = path
+        self.lock = lock
+
+    async def generate_content_async(self, prompt, stream=False):
+        response = await self.model.generate_content_async(prompt, stream=stream)
+        if not stream:
+            try:
+                line = json.dumps({'prompt': prompt, 'text': response.text})
+                with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except Exception as e:
+                logger.warning(f"Recording response failed: {str(e)}")
+        return response
+
+
+class RecordingProvider:
+    """Gemini provider that records responses for later replay"""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+        logger.info(f"Recording LLM responses to {path}")
+
+    def __getattr__(self, attr):
+        return getattr(self.inner, attr)
+
+    def get_model(self):
+        return RecordingModel(self.inner.get_model(), self.path, self._lock)
+
+
+def create_provider(name, model_name, generation_config):
+    """Provider for LLM_PROVIDER ('gemini', 'stub' or 'replay')"""
+    name = (name or 'gemini').lower()
+    if name == 'stub':
+        return StubProvider()
+    if name == 'replay':
+        return ReplayProvider()
+    if name != 'gemini':
+        raise ValueError(f"Unknown LLM_PROVIDER: {name}")
+    provider = GeminiProvider(model_name, generation_config)
+    if LLM_RECORD_PATH:
+        return RecordingProvider(provider, LLM_RECORD_PATH)
+    return provider
+
+
+# ---------------------------------------------------------------------------
+# Stub content
+# ---------------------------------------------------------------------------
+
+TOPIC = re.compile(r'topic:\s*"([^"]+)"')
+ONLY_NUMBERS = re.compile(r'ONLY these quiz questions:\s*([\d,\s]+)')
+EXACT_COUNT = re.compile(r'EXACTLY\s+(\d+)')
+SUBJECT = re.compile(r'questions about (.+?)\.\s')
+STUDENT = re.compile(r'Strengths:\s*(.*?)\s*\|\s*Weaknesses:\s*(.*)')
+SINGLE_CATEGORY = re.compile(r'\[(STRENGTH|WEAKNESS) - DIFFICULTY\]')
+
+
+def stub_content(prompt):
+    """Deterministic, correctly formatted content for the app's prompt types"""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    topic_match = TOPIC.search(prompt)
+    topic = topic_match.group(1) if topic_match else 'the topic'
+
+    if 'Correct Answer: [A/B/C/D]' in prompt:
+        return _stub_mcq(prompt, rng)
+    if 'flashcard' in prompt:
+        return '\n\n'.join(
+            f"Q: What is key idea {i} of {topic}?\nA: Key idea {i} of {topic} is {_phrase(rng)}."
+            for i in range(1, 6))
+    if '[EASY] Question' in prompt:
+        return '\n\n'.join(
+            f"[{level}] Which statement about {topic} is true ({_phrase(rng)})?\nAnswer: {_phrase(rng)}"
+            for level in ('EASY', 'MEDIUM', 'HARD'))
+    if 'study notes' in prompt:
+        sections = []
+        for heading in ('Key Concepts', 'Definitions', 'Important Points', 'Examples'):
+            bullets = '\n'.join(f"- **{topic} {i}**: {_sentence(rng)}" for i in range(1, 6))
+            sections.append(f"## {heading}\n\n{bullets}")
+        return f"# {topic}\n\n" + '\n\n'.join(sections)
+    return ' '.join(_sentence(rng) for _ in range(8))
+
+
+def _stub_mcq(prompt, rng):
+    only = ONLY_NUMBERS.search(prompt)
+    if only:
+        numbers = [int(n) for n in re.findall(r'\d+', only.group(1))]
+    else:
+        count = EXACT_COUNT.search(prompt)
+        numbers = list(range(1, int(count.group(1)) + 1 if count else 21))
+
+    single = SINGLE_CATEGORY.search(prompt)
+    subject = SUBJECT.search(prompt)
+    student = STUDENT.search(prompt)
+
+    blocks = []
+    for n in numbers:
+        if single:
+            category = single.group(1)
+        else:
+            category = 'STRENGTH' if n <= 10 else 'WEAKNESS'
+        if subject:
+            about = subject.group(1)
+        elif student:
+            about = student.group(1 if category == 'STRENGTH' else 2)
+        else:
+            about = 'the subject'
+        level = rng.choice(('MEDIUM', 'HARD') if category == 'STRENGTH' else ('EASY', 'MEDIUM'))
+        options = [_phrase(rng) for _ in range(4)]
+        blocks.append(
+            f"Question {n} [{category} - {level}]\n"
+            f"In {about}, which option best describes {_phrase(rng)} ({n})?\n"
+            + ''.join(f"{letter}) {option}\n" for letter, option in zip('ABCD', options))
+            + f"Correct Answer: {rng.choice('ABCD')}\n"
+            f"Explanation: {_sentence(rng)}"
+        )
+    return '\n\n'.join(blocks)
+
+
+WORDS = ('function', 'derivative', 'energy', 'structure', 'process', 'balance', 'rate', 'model',
+         'pattern', 'system', 'value', 'change', 'limit', 'force', 'reaction', 'theory')
+
+
+def _phrase(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(3))
+
+
+def _sentence(rng):
+    return f"The {_phrase(rng)} relates to the {_phrase(rng)} through a consistent rule."
@@ -0,0 +1,274 @@
+"""
+PeerFuse Load Test
+Boots app.py under gunicorn against the stub (or replay) LLM provider and
+drives concurrent load at the endpoints, reporting throughput and latency
+percentiles per server configuration
+
+    python load_test.py --configs 1x4 1x32 2x16 --concurrency 32 --duration 20
+    python load_test.py --url http://localhost:5000 --endpoints notes quiz
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TOPICS = ['Integration', 'Derivatives', 'Limits', 'Vectors', 'Matrices', 'Probability', 'Statistics',
+          'Thermodynamics', 'Optics', 'Kinematics', 'Organic Chemistry', 'Stoichiometry', 'Genetics',
+          'Cell Biology', 'Recursion', 'Sorting', 'Graphs', 'Hash Tables', 'Poetry', 'Essay Writing']
+
+SUBJECTS = ['Calculus', 'Physics', 'Chemistry', 'Biology', 'Programming', 'Statistics', 'Literature']
+
+# endpoint name -> (path, body builder)
+ENDPOINTS = {
+    'notes': ('/generate-notes', lambda topic, rng: {'topic': topic}),
+    'flashcards': ('/generate-flashcards', lambda topic, rng: {'topic': topic}),
+    'quiz': ('/generate-quiz', lambda topic, rng: {'topic': topic}),
+    'presession': ('/generate-presession-quiz', lambda topic, rng: {
+        'strengths': rng.sample(SUBJECTS, 2), 'weaknesses': rng.sample(SUBJECTS, 1),
+        'userId': f'load-{rng.randrange(1000)}'}),
+    'batch': ('/generate-batch', lambda topic, rng: {'items': [
+        {'type': t, 'topic': topic} for t in ('notes', 'flashcards', 'quiz')]}),
+    'health': ('/health', None),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def parse_config(spec):
+    """'2x16' -> 2 workers x 16 threads; optional ':gevent' style worker class suffix"""
+    spec, _, worker_class = spec.partition(':')
+    workers, _, threads = spec.partition('x')
+    return {'name': spec + (f':{worker_class}' if worker_class else ''), 'workers': int(workers),
+            'threads': int(threads or 1), 'worker_class': worker_class or 'gthread'}
+
+
+class Server:
+    """gunicorn running app:app with the stub provider in a scratch directory"""
+
+    def __init__(self, config, env_overrides):
+        self.config = config
+        self.port = free_port()
+        self.tmp = tempfile.mkdtemp(prefix='peerfuse-load-')
+        self.env = dict(os.environ, **{
+            'LLM_PROVIDER': 'stub',
+            # Quota is not what we are measuring unless asked
+            'GEMINI_RPM': '1000000',
+            'GEMINI_TPM': '1000000000',
+            'QUESTION_BANK_PATH': os.path.join(self.tmp, 'question_bank.db'),
+        })
+        self.env.pop('PERSISTENT_CACHE_PATH', None)
+        self.env.update(env_overrides)
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+               '--workers', str(self.config['workers']), '--threads', str(self.config['threads']),
+               '--worker-class', self.config['worker_class'], '--timeout', '300',
+               '--log-level', 'warning', 'app:app']
+        self.process = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=self.env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {self.process.returncode}")
+            try:
+                status, _ = request(self.url, 'GET', '/health', timeout=2)
+                if status == 200:
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("Server did not become healthy within 60s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def request(base_url, method, path, body=None, timeout=300, conn=None):
+    """One HTTP request; returns (status, parsed JSON or None)"""
+    parsed = urlparse(base_url)
+    own = conn is None
+    if own:
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        conn.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+    finally:
+        if own:
+            conn.close()
+
+
+def run_load(base_url, endpoints, concurrency, duration, unique_topics, mode, seed=0):
+    """
+    concurrency client threads loop over the endpoints for duration seconds
+    mode 'async' submits jobs and long-polls them to completion
+    Returns per-endpoint latency samples and error counts
+    """
+    samples = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+    topics = (TOPICS + [f'Topic {i}' for i in range(unique_topics)])[:max(1, unique_topics)]
+    parsed = urlparse(base_url)
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=300)
+        while time.time() < stop_at:
+            name = rng.choice(endpoints)
+            path, build = ENDPOINTS[name]
+            body = build(rng.choice(topics), rng) if build else None
+            method = 'POST' if build else 'GET'
+            if mode == 'async' and body is not None and name != 'batch':
+                body['async'] = True
+            start = time.perf_counter()
+            try:
+                status, data = request(base_url, method, path, body, conn=conn)
+                if status == 202 and data and data.get('jobId'):
+                    while status == 202 or (data and data.get('status') in ('queued', 'running')):
+                        status, data = request(base_url, 'GET', f"/jobs/{data['jobId']}?wait=20", conn=conn)
+                    ok = status == 200 and data is not None and data.get('status') == 'done'
+                else:
+                    ok = status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=300)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    samples[name].append(elapsed)
+                else:
+                    errors[name] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples, errors, wall):
+    rows = {}
+    all_latencies = []
+    for name in samples:
+        latencies = sorted(samples[name])
+        all_latencies.extend(latencies)
+        rows[name] = _row(latencies, errors[name], wall)
+    rows['ALL'] = _row(sorted(all_latencies), sum(errors.values()), wall)
+    return rows
+
+
+def _row(latencies, error_count, wall):
+    return {
+        'requests': len(latencies),
+        'errors': error_count,
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round((latencies[-1] if latencies else 0) * 1000, 1)
+    }
+
+
+def print_report(results):
+    print("\n" + "=" * 96)
+    print(f"{'Config':<14} {'Endpoint':<12} {'Req':>7} {'Err':>5} {'RPS':>8} "
+          f"{'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("=" * 96)
+    for config_name, rows in results.items():
+        for endpoint, r in rows.items():
+            print(f"{config_name:<14} {endpoint:<12} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.2f} "
+                  f"{r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f}")
+        print("-" * 96)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PeerFuse backend load test')
+    parser.add_argument('--configs', nargs='+', default=['1x32'],
+                        help='gunicorn configs as WORKERSxTHREADS[:worker_class], e.g. 1x32 2x16 1x8:gevent')
+    parser.add_argument('--url', help='Load an already running server instead of booting configs')
+    parser.add_argument('--endpoints', nargs='+', default=['notes', 'flashcards', 'quiz'],
+                        choices=sorted(ENDPOINTS), help='Endpoints to mix uniformly')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds of load per config')
+    parser.add_argument('--unique-topics', type=int, default=200,
+                        help='Distinct topics (lower means more cache hits)')
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync',
+                        help='async submits background jobs and long-polls them')
+    parser.add_argument('--provider', choices=['stub', 'replay'], default='stub')
+    parser.add_argument('--latency-ms', type=float, default=800, help='Stub LLM latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Stub LLM error rate')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Stub LLM 429 rate')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    env = {
+        'LLM_PROVIDER': args.provider,
+        'STUB_LATENCY_MS': str(args.latency_ms),
+        'STUB_ERROR_RATE': str(args.error_rate),
+        'STUB_RATE_LIMIT_RATE': str(args.rate_limit_rate),
+    }
+
+    results = {}
+    if args.url:
+        samples, errors, wall = run_load(args.url, args.endpoints, args.concurrency, args.duration,
+                                         args.unique_topics, args.mode)
+        results[args.url] = summarize(samples, errors, wall)
+    else:
+        for spec in args.configs:
+            config = parse_config(spec)
+            print(f"Booting {config['name']} ({config['workers']} workers x {config['threads']} threads, "
+                  f"{config['worker_class']}) ...")
+            with Server(config, env) as server:
+                samples, errors, wall = run_load(server.url, args.endpoints, args.concurrency,
+                                                 args.duration, args.unique_topics, args.mode)
+            results[config['name']] = summarize(samples, errors, wall)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,453 @@
+"""
+PeerFuse Match Index
+Server-side port of the js/matching.js scoring rules (complementary skills
+capped at 80 points, 20% bonus for peers at a similar quiz level); time zones
+are compared for equality like simulate_matching.py rather than by UTC offset
+Keeps each user's top-K candidates materialized; saving or rejecting a profile
+rescores only users sharing a complementary subject (inverted subject index)
+Profiles and rejections can be mirrored to SQLite (MatchStore) so the index
+is rebuilt after a worker recycle and kept in step across workers
+"""
+
+import bisect
+import heapq
+import json
+import threading
+from collections import defaultdict
+
+from sqlite_store import SQLiteStore
+
+# Unified matching weights (skills-first configuration, same as js/config.js)
+MATCHING_WEIGHTS = {
+    'compPerMatch': 40,
+    'availability': 30,
+    'preferredMode': 15,
+    'primaryGoal': 12,
+    'preferredFrequency': 12,
+    'partnerPreference': 10,
+    'sessionLength': 10,
+    'timeZone': 10,
+    'studyPersonality': 10
+}
+
+# Categorical factors compared for equality
+PREFERENCE_FIELDS = ['availability', 'preferredMode', 'primaryGoal', 'preferredFrequency',
+                     'partnerPreference', 'sessionLength', 'timeZone', 'studyPersonality']
+
+# Penalty when only one factor matches
+SINGLE_FACTOR_PENALTY = 50
+
+# Complementary skills add at most this much (js/matching.js MAX_COMPLEMENTARY_SCORE)
+MAX_COMPLEMENTARY_SCORE = 80
+
+# Complementary match worth more when both sides are still developing in the subject
+SIMILAR_LEVEL_BONUS = 1.2
+
+# Candidates kept materialized per user
+MATCH_TOP_K = 20
+
+
+def _norm(value):
+    return str(value or '').lower().strip()
+
+
+def normalize_profile(profile):
+    """Normalize a profile for comparison (lowercase/trimmed, skills as sets)"""
+    normalized = {field: _norm(profile.get(field)) for field in PREFERENCE_FIELDS}
+    for field in ('strengths', 'weaknesses'):
+        values = profile.get(field) or []
+        normalized[field] = frozenset(_norm(v) for v in values if _norm(v))
+    quiz = profile.get('preQuizResults') or {}
+    normalized['struggling_strengths'] = quiz.get('strugglingInStrengths') is True
+    normalized['struggling_weaknesses'] = quiz.get('strugglingInWeaknesses') is True
+    return normalized
+
+
+def calculate_match_score(user_a, user_b, weights=MATCHING_WEIGHTS):
+    """
+    Calculate match score between two normalized profiles
+    Returns (score, comp_matches) like simulate_matching.calculate_match_score
+    Complementary matches stop counting once they reach MAX_COMPLEMENTARY_SCORE
+    """
+    score = 0
+    comp_matches = 0
+    for weak, strong in ((user_a, user_b), (user_b, user_a)):
+        per_match = weights['compPerMatch']
+        if weak['struggling_weaknesses'] and strong['struggling_strengths']:
+            per_match *= SIMILAR_LEVEL_BONUS
+        for _ in range(len(weak['weaknesses'] & strong['strengths'])):
+            if score >= MAX_COMPLEMENTARY_SCORE:
+                break
+            score += min(per_match, MAX_COMPLEMENTARY_SCORE - score)
+            comp_matches += 1
+    match_count = 0
+
+    for field in PREFERENCE_FIELDS:
+        if user_a[field] and user_a[field] == user_b[field]:
+            score += weights[field]
+            match_count += 1
+
+    # PENALTY: If only 1 factor matches out of all (9 total factors), subtract 50
+    if match_count == 1:
+        score -= SINGLE_FACTOR_PENALTY
+
+    return score, comp_matches
+
+
+def profile_id(profile):
+    """User id the frontend uses for a profile (id, falling back to username)"""
+    for key in ('id', 'userId', 'username'):
+        if profile.get(key) not in (None, ''):
+            return profile[key]
+    return None
+
+
+def _rank(score, comp, candidate_id):
+    """Sort key for a materialized row: best score, then most complementary skills, then id"""
+    return (-score, -comp, str(candidate_id), candidate_id)
+
+
+class MatchStore(SQLiteStore):
+    """
+    Raw profiles and rejection lists by user, each row stamped with a change
+    sequence number so an index can load only what changed since it last synced
+    Removed profiles stay as rows with a NULL profile until overwritten
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS match_profiles ("
+                " user_id TEXT PRIMARY KEY, profile TEXT, rejected TEXT NOT NULL DEFAULT '[]',"
+                " seq INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS match_profiles_seq ON match_profiles (seq)")
+
+    def _write(self, user_id, column, value):
+        with self._transaction() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM match_profiles").fetchone()[0]
+            conn.execute(
+                f"INSERT INTO match_profiles (user_id, {column}, seq) VALUES (?, ?, ?)"
+                f" ON CONFLICT (user_id) DO UPDATE SET {column} = excluded.{column}, seq = excluded.seq",
+                (json.dumps(user_id), value, seq)
+            )
+        return seq
+
+    def save_profile(self, user_id, profile):
+        """
+        Store a raw profile (None marks it removed, which also clears rejections)
+        Returns the change's sequence number (None if there was nothing to remove)
+        """
+        if profile is None:
+            with self._transaction() as conn:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM match_profiles").fetchone()[0]
+                cursor = conn.execute("UPDATE match_profiles SET profile = NULL, rejected = '[]', seq = ?"
+                                      " WHERE user_id = ?", (seq, json.dumps(user_id)))
+            return seq if cursor.rowcount else None
+        return self._write(user_id, 'profile', json.dumps(profile))
+
+    def save_rejections(self, user_id, rejected):
+        """Store a user's full rejection list; returns the change's sequence number"""
+        return self._write(user_id, 'rejected', json.dumps(sorted(rejected, key=str)))
+
+    def changes(self, since=0):
+        """(seq, user_id, raw profile or None, rejected ids) for rows changed after since"""
+        rows = self._connect().execute(
+            "SELECT seq, user_id, profile, rejected FROM match_profiles WHERE seq > ? ORDER BY seq",
+            (since,)).fetchall()
+        return [(seq, json.loads(user_id), json.loads(profile) if profile is not None else None,
+                 json.loads(rejected)) for seq, user_id, profile, rejected in rows]
+
+
+class MatchIndex:
+    """
+    In-memory profile store with inverted subject indexes
+    Only users strong in one of my weaknesses or weak in one of my strengths
+    can have a complementary skill, so only those candidates are scored
+
+    Each indexed user's best top_k candidates (minus those they rejected) are
+    kept as a sorted row. Scores are symmetric, so saving a profile rescores
+    the pair once for every old or new candidate and patches their rows; a row
+    is rebuilt only when one of its entries drops out and nothing known can
+    replace it
+
+    With a MatchStore every change is written through, and sync() applies
+    changes made by other processes (bulk loaded while the index is empty)
+    """
+
+    def __init__(self, weights=MATCHING_WEIGHTS, top_k=MATCH_TOP_K, store=None):
+        self.weights = weights
+        self.top_k = top_k
+        self.store = store
+        self.synced_seq = 0
+        self.profiles = {}                 # user id -> normalized profile
+        self.strong_in = defaultdict(set)  # subject -> ids strong in it
+        self.weak_in = defaultdict(set)    # subject -> ids weak in it
+        self.rejected = defaultdict(set)   # user id -> ids they rejected
+        self.rows = {}                     # user id -> sorted [_rank(...)] of length <= top_k
+        self.lock = threading.RLock()
+        self.rows_patched = 0
+        self.rows_rebuilt = 0
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __contains__(self, user_id):
+        with self.lock:
+            return user_id in self.profiles
+
+    def sync(self):
+        """Apply profiles and rejections stored since the last sync (no-op without a store)"""
+        if self.store is None:
+            return 0
+        with self.lock:
+            changes = self.store.changes(self.synced_seq)
+            if not changes:
+                return 0
+            if not self.profiles and not self.rejected:
+                self._load(changes)
+            else:
+                for _, user_id, profile, rejected in changes:
+                    if profile is None:
+                        self._remove(user_id)
+                    else:
+                        self._upsert(user_id, profile)
+                    if set(rejected) != self.rejected.get(user_id, set()):
+                        self._set_rejections(user_id, set(rejected))
+            self.synced_seq = changes[-1][0]
+            return len(changes)
+
+    def _load(self, changes):
+        """
+        Bulk apply changes (removals and cleared rejections included), then
+        build every row once; meant for an empty index at startup
+        """
+        for _, user_id, profile, rejected in changes:
+            if rejected:
+                self.rejected[user_id] = set(rejected)
+            else:
+                self.rejected.pop(user_id, None)
+            self._unindex(user_id)
+            self.rows.pop(user_id, None)
+            if profile is None:
+                continue
+            normalized = normalize_profile(profile)
+            self.profiles[user_id] = normalized
+            for subject in normalized['strengths']:
+                self.strong_in[subject].add(user_id)
+            for subject in normalized['weaknesses']:
+                self.weak_in[subject].add(user_id)
+        for user_id in self.profiles:
+            self._rebuild_row(user_id)
+
+    def upsert(self, user_id, profile):
+        """Add or replace a profile, updating the rows it can appear in"""
+        with self.lock:
+            normalized = self._upsert(user_id, profile)
+            if self.store is not None:
+                self._wrote(self.store.save_profile(user_id, profile))
+        return normalized
+
+    def _wrote(self, seq):
+        """
+        Advance synced_seq past this process's own write when nothing from
+        another process came in between (otherwise the next sync applies both)
+        """
+        if seq is not None and seq == self.synced_seq + 1:
+            self.synced_seq = seq
+
+    def _upsert(self, user_id, profile):
+        normalized = normalize_profile(profile)
+        with self.lock:
+            old = self.profiles.get(user_id)
+            if old == normalized and user_id in self.rows:
+                return normalized
+            affected = self.candidates(old) if old is not None else set()
+            self._unindex(user_id)
+            self.profiles[user_id] = normalized
+            for subject in normalized['strengths']:
+                self.strong_in[subject].add(user_id)
+            for subject in normalized['weaknesses']:
+                self.weak_in[subject].add(user_id)
+
+            affected |= self.candidates(normalized)
+            affected.discard(user_id)
+            for other_id in affected:
+                self._update_pair(other_id, user_id)
+            self._rebuild_row(user_id)
+        return normalized
+
+    def remove(self, user_id):
+        """Drop a profile (and its rejections) from the index and from the rows that listed it"""
+        with self.lock:
+            self._remove(user_id)
+            if self.store is not None:
+                self._wrote(self.store.save_profile(user_id, None))
+
+    def _remove(self, user_id):
+        with self.lock:
+            self.rejected.pop(user_id, None)
+            old = self.profiles.get(user_id)
+            if old is None:
+                return
+            affected = self.candidates(old)
+            self._unindex(user_id)
+            self.rows.pop(user_id, None)
+            for other_id in affected - {user_id}:
+                self._update_pair(other_id, user_id)
+
+    def reject(self, user_id, rejected_id):
+        """Hide rejected_id from user_id's matches; only that user's row changes"""
+        with self.lock:
+            self.rejected[user_id].add(rejected_id)
+            if user_id in self.profiles:
+                self._drop_from_row(user_id, rejected_id)
+            if self.store is not None:
+                self._wrote(self.store.save_rejections(user_id, self.rejected[user_id]))
+
+    def clear_rejections(self, user_id):
+        with self.lock:
+            self._set_rejections(user_id, set())
+            if self.store is not None:
+                self._wrote(self.store.save_rejections(user_id, ()))
+
+    def _set_rejections(self, user_id, rejected):
+        if rejected:
+            self.rejected[user_id] = rejected
+        elif not self.rejected.pop(user_id, None):
+            return
+        if user_id in self.profiles:
+            self._rebuild_row(user_id)
+
+    def rejected_ids(self, user_id):
+        """Ids user_id has rejected"""
+        with self.lock:
+            return set(self.rejected.get(user_id, ()))
+
+    def _unindex(self, user_id):
+        old = self.profiles.pop(user_id, None)
+        if old is None:
+            return
+        for subject in old['strengths']:
+            self.strong_in[subject].discard(user_id)
+        for subject in old['weaknesses']:
+            self.weak_in[subject].discard(user_id)
+
+    def _entry(self, user_id, candidate_id):
+        """Row entry for a candidate, or None when not a viable match for user_id"""
+        candidate = self.profiles.get(candidate_id)
+        if candidate is None or candidate_id == user_id or candidate_id in self.rejected.get(user_id, ()):
+            return None
+        score, comp = calculate_match_score(self.profiles[user_id], candidate, self.weights)
+        # HARD REQUIREMENT: at least 1 complementary skill
+        return _rank(score, comp, candidate_id) if comp > 0 else None
+
+    def _row_index(self, row, candidate_id):
+        for i, entry in enumerate(row):
+            if entry[3] == candidate_id:
+                return i
+        return None
+
+    def _update_pair(self, user_id, candidate_id):
+        """Patch user_id's row after candidate_id's profile changed"""
+        row = self.rows.get(user_id)
+        if row is None:
+            return
+        entry = self._entry(user_id, candidate_id)
+        index = self._row_index(row, candidate_id)
+        full = len(row) >= self.top_k
+        self.rows_patched += 1
+
+        if index is None:
+            if entry is None:
+                return
+            if not full:
+                bisect.insort(row, entry)
+            elif entry < row[-1]:
+                bisect.insort(row, entry)
+                row.pop()
+            return
+
+        # Anything outside a full row ranks after its last entry
+        last = row[-1]
+        del row[index]
+        if entry is not None and (not full or entry <= last):
+            bisect.insort(row, entry)
+        elif full:
+            self._rebuild_row(user_id)
+
+    def _drop_from_row(self, user_id, candidate_id):
+        row = self.rows.get(user_id)
+        index = self._row_index(row, candidate_id) if row is not None else None
+        if index is None:
+            return
+        full = len(row) >= self.top_k
+        del row[index]
+        if full:
+            self._rebuild_row(user_id)
+
+    def _rebuild_row(self, user_id):
+        """Score every candidate sharing a complementary subject (O(candidates))"""
+        entries = (self._entry(user_id, candidate_id)
+                   for candidate_id in self.candidates(self.profiles[user_id]))
+        self.rows[user_id] = heapq.nsmallest(self.top_k, (e for e in entries if e is not None))
+        self.rows_rebuilt += 1
+
+    def candidates(self, profile):
+        """Ids sharing at least one complementary subject with a normalized profile"""
+        with self.lock:
+            ids = set()
+            for subject in profile['weaknesses']:
+                ids |= self.strong_in.get(subject, set())
+            for subject in profile['strengths']:
+                ids |= self.weak_in.get(subject, set())
+            return ids
+
+    def matches(self, user_id, k=10, exclude=()):
+        """
+        Best k matches of an indexed user read from the materialized row (O(top_k))
+        Falls back to scoring candidates when k or exclude reach past the row
+        """
+        excluded = set(exclude)
+        with self.lock:
+            row = self.rows.get(user_id)
+            if row is not None:
+                picked = [e for e in row if e[3] not in excluded][:k]
+                # A short row already holds every viable candidate
+                if len(picked) == k or len(row) < self.top_k:
+                    return [{'userId': e[3], 'score': -e[0], 'compMatches': -e[1]} for e in picked]
+            excluded |= self.rejected.get(user_id, set())
+            return self.top_matches(self.profiles[user_id], k=k, user_id=user_id, exclude=excluded)
+
+    def top_matches(self, profile, k=10, user_id=None, exclude=()):
+        """
+        Best k viable matches for a normalized profile by scanning its candidates
+        Returns a list of {'userId', 'score', 'compMatches'} sorted by score
+        """
+        excluded = set(exclude)
+        if user_id is not None:
+            excluded.add(user_id)
+
+        with self.lock:
+            scored = []
+            for candidate_id in self.candidates(profile) - excluded:
+                score, comp = calculate_match_score(profile, self.profiles[candidate_id], self.weights)
+                # HARD REQUIREMENT: at least 1 complementary skill (guaranteed by the index)
+                if comp > 0:
+                    scored.append(_rank(score, comp, candidate_id))
+
+        best = heapq.nsmallest(k, scored)
+        return [{'userId': e[3], 'score': -e[0], 'compMatches': -e[1]} for e in best]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'profiles': len(self.profiles),
+                'persistent': self.store is not None,
+                'synced_seq': self.synced_seq,
+                'top_k': self.top_k,
+                'rows': len(self.rows),
+                'rows_patched': self.rows_patched,
+                'rows_rebuilt': self.rows_rebuilt
+            }
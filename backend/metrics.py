@@ -0,0 +1,158 @@
+"""
+PeerFuse Metrics
+Minimal Prometheus text-format counters, gauges and histograms (no extra dependency)
+Values are per process; scrape each gunicorn worker separately if running several
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (Gemini calls run from ~1s up to minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160, 300)
+
+# Output size buckets in characters
+SIZE_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}'
+                                for k, v in items]
+
+
+class Gauge(Metric):
+    """Gauge read from a callback at scrape time: fn() -> number or {labels tuple: number}"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn, labels=(), kind=None):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+        if kind:
+            self.kind = kind
+
+    def render(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [f'{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}'
+                                for k, v in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(counts[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Shared by the app and the Gemini client
+STAGE_SECONDS = registry.register(Histogram(
+    'peerfuse_stage_seconds', 'Time spent per processing stage', ('stage', 'content_type')))
+GEMINI_SECONDS = registry.register(Histogram(
+    'peerfuse_gemini_request_seconds', 'Gemini upstream call latency per attempt', ('mode', 'outcome')))
+GEMINI_OUTPUT_CHARS = registry.register(Histogram(
+    'peerfuse_gemini_output_chars', 'Generated text size in characters', ('mode',), buckets=SIZE_BUCKETS))
+GEMINI_RETRIES = registry.register(Counter(
+    'peerfuse_gemini_retries_total', 'Gemini attempts retried after a failure', ('reason',)))
+
+
+def stage(name, content_type=''):
+    """Context manager timing one stage into peerfuse_stage_seconds"""
+    return STAGE_SECONDS.time(stage=name, content_type=content_type)
@@ -0,0 +1,187 @@
+"""
+PeerFuse Prompt Templates
+Precompiled prompt templates rendered from normalized inputs
+Topics are normalized (unicode, whitespace, case) and subject lists put in a
+canonical order, so equivalent requests render identical prompts and share
+one cache entry
+"""
+
+import unicodedata
+from string import Template
+
+from question_bank import CATEGORY_LEVELS
+
+
+# All-caps words up to this many letters are taken as acronyms (DNA, ATP)
+ACRONYM_MAX_LETTERS = 4
+
+
+def _letters(word):
+    return [c for c in word if c.isalpha()]
+
+
+def _is_acronym(word):
+    letters = _letters(word)
+    return bool(letters) and len(letters) <= ACRONYM_MAX_LETTERS and all(c.isupper() for c in letters)
+
+
+def _is_mixed_case(word):
+    """Lower and upper case past the first letter: mRNA, JavaScript"""
+    letters = _letters(word)
+    return any(c.islower() for c in letters) and any(c.isupper() for c in letters[1:])
+
+
+def normalize_topic(topic):
+    """
+    Canonical topic text: NFKC, collapsed whitespace, lowercase words
+    Short all-caps acronyms (DNA) and mixed-case words (mRNA) keep their case,
+    unless the whole topic is in capitals ("LINEAR ALGEBRA" -> "linear algebra")
+    """
+    text = unicodedata.normalize('NFKC', str(topic or ''))
+    words = text.split()
+    shouted = (all(not any(c.islower() for c in w) for w in words)
+               and any(len(_letters(w)) > ACRONYM_MAX_LETTERS for w in words))
+    return ' '.join(w if not shouted and (_is_acronym(w) or _is_mixed_case(w)) else w.lower()
+                    for w in words)
+
+
+def canonical_subjects(subjects):
+    """Normalized, de-duplicated subjects in a stable order"""
+    unique = {}
+    for subject in subjects or []:
+        normalized = normalize_topic(subject)
+        if normalized:
+            unique.setdefault(normalized.casefold(), normalized)
+    return [unique[key] for key in sorted(unique)]
+
+
+class PromptTemplate:
+    """A named template compiled once at import; renders with $placeholders"""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.template = Template(text.strip())
+
+    def render(self, **fields):
+        return self.template.substitute(fields)
+
+
+MCQ_FORMAT = """FORMAT for EVERY question:
+Question [N] [$category_format - DIFFICULTY]
+[Question text]?
+A) [Option]
+B) [Option]
+C) [Option]
+D) [Option]
+Correct Answer: [A/B/C/D]
+Explanation: [Brief explanation]"""
+
+PRESESSION_SPLIT = """Questions 1-10: STRENGTHS ($strengths) - challenging
+Questions 11-20: WEAKNESSES ($weaknesses) - easier"""
+
+TEMPLATES = {t.name: t for t in [
+    PromptTemplate('notes', """
+Create comprehensive study notes for the topic: "$topic"
+
+Include:
+- Key concepts and definitions
+- Important points to remember
+- Examples where applicable
+
+Format the notes clearly with headings and bullet points."""),
+
+    PromptTemplate('flashcards', """
+Create 5 flashcard Q&A pairs for the topic: "$topic"
+
+Format each flashcard as:
+Q: [question]
+A: [answer]
+
+Separate each pair with a blank line. Make questions clear and answers concise but complete."""),
+
+    PromptTemplate('quiz', """
+Create a quiz for the topic: "$topic" with 3 questions at different difficulty levels.
+
+Format as:
+[EASY] Question
+Answer: [answer]
+
+[MEDIUM] Question
+Answer: [answer]
+
+[HARD] Question
+Answer: [answer]
+
+Make questions challenging but fair."""),
+
+    PromptTemplate('default', 'Explain $topic.'),
+
+    PromptTemplate('presession_quiz', f"""
+You MUST create EXACTLY 20 questions. Not 5, not 10, but TWENTY (20) questions total.
+
+STUDENT: Strengths: $strengths | Weaknesses: $weaknesses
+
+MANDATORY: Generate questions 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, and 20.
+
+{MCQ_FORMAT.replace('$category_format', 'STRENGTH/WEAKNESS')}
+
+{PRESESSION_SPLIT}
+
+GENERATE ALL 20 NOW - DO NOT STOP UNTIL YOU REACH QUESTION 20:"""),
+
+    PromptTemplate('presession_topup', f"""
+Create ONLY these quiz questions: $numbers. Use exactly these question numbers.
+
+STUDENT: Strengths: $strengths | Weaknesses: $weaknesses
+
+{MCQ_FORMAT.replace('$category_format', 'STRENGTH/WEAKNESS')}
+
+{PRESESSION_SPLIT}
+
+GENERATE QUESTIONS $numbers NOW:"""),
+
+    PromptTemplate('bank_topup', f"""
+Create EXACTLY $count multiple-choice questions about $subject.
+
+All questions are $tone: use only $level_a and $level_b difficulty.
+
+{MCQ_FORMAT.replace('$category_format', '$category')}
+
+GENERATE ALL $count NOW:"""),
+]}
+
+
+def render(name, **fields):
+    return TEMPLATES[name].render(**fields)
+
+
+def _subjects_text(subjects):
+    subjects = canonical_subjects(subjects)
+    return ', '.join(subjects) if subjects else 'None specified'
+
+
+def generate_prompt(content_type, topic):
+    """Generate appropriate prompt based on content type"""
+    name = content_type if content_type in ('notes', 'flashcards', 'quiz') else 'default'
+    return render(name, topic=normalize_topic(topic))
+
+
+def build_presession_prompt(strengths, weaknesses):
+    """20-question pre-session quiz prompt for a student's strengths/weaknesses"""
+    return render('presession_quiz', strengths=_subjects_text(strengths),
+                  weaknesses=_subjects_text(weaknesses))
+
+
+def build_presession_topup_prompt(strengths, weaknesses, numbers):
+    """Re-request only the questions that were missing or malformed"""
+    return render('presession_topup', strengths=_subjects_text(strengths),
+                  weaknesses=_subjects_text(weaknesses),
+                  numbers=', '.join(str(n) for n in sorted(numbers)))
+
+
+def build_bank_topup_prompt(subject, category, count):
+    """Questions on a single subject for the question bank"""
+    level_a, level_b = CATEGORY_LEVELS[category]
+    return render('bank_topup', count=count, subject=normalize_topic(subject), category=category,
+                  tone='challenging' if category == 'STRENGTH' else 'easier',
+                  level_a=level_a, level_b=level_b)
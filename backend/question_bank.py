@@ -0,0 +1,153 @@
+"""
+PeerFuse Question Bank
+SQLite store of parsed quiz questions indexed by subject and difficulty
+Pre-session quizzes are assembled from it; Gemini only tops up thin subjects
+"""
+
+import hashlib
+import json
+import time
+import unicodedata
+
+from quiz import PRESESSION_QUESTION_COUNT
+from sqlite_store import SQLiteStore
+
+# Questions 1-10 cover strengths (challenging), 11-20 weaknesses (easier)
+CATEGORY_LEVELS = {
+    'STRENGTH': ('HARD', 'MEDIUM'),
+    'WEAKNESS': ('EASY', 'MEDIUM')
+}
+
+
+def normalize_subject(subject):
+    return ' '.join(unicodedata.normalize('NFKC', str(subject or '')).lower().split())
+
+
+def question_fingerprint(question):
+    """Content hash so regenerated duplicates are stored once"""
+    payload = json.dumps([' '.join(question['question'].lower().split()),
+                          [' '.join(o.lower().split()) for o in question['options']]])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def allocate_slots(strengths, weaknesses, total=PRESESSION_QUESTION_COUNT):
+    """
+    Split quiz slots across subjects round-robin: half for strengths, half for
+    weaknesses (all of them if the other list is empty)
+    Returns [(subject, category, count)] in quiz order
+    """
+    strengths = [s for s in dict.fromkeys(normalize_subject(s) for s in strengths) if s]
+    weaknesses = [s for s in dict.fromkeys(normalize_subject(s) for s in weaknesses) if s]
+    if not strengths and not weaknesses:
+        return []
+    if not weaknesses:
+        per_category = [(strengths, 'STRENGTH', total)]
+    elif not strengths:
+        per_category = [(weaknesses, 'WEAKNESS', total)]
+    else:
+        per_category = [(strengths, 'STRENGTH', total // 2), (weaknesses, 'WEAKNESS', total - total // 2)]
+
+    slots = []
+    for subjects, category, count in per_category:
+        base, extra = divmod(count, len(subjects))
+        for i, subject in enumerate(subjects):
+            n = base + (1 if i < extra else 0)
+            if n:
+                slots.append((subject, category, n))
+    return slots
+
+
+class QuestionBank(SQLiteStore):
+    """
+    Persistent question store shared by gunicorn workers (WAL mode)
+    Tracks which questions each user has been served so repeat quizzes differ
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.assembled = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                " id INTEGER PRIMARY KEY, subject TEXT NOT NULL, category TEXT NOT NULL,"
+                " level TEXT, fingerprint TEXT NOT NULL UNIQUE, data TEXT NOT NULL,"
+                " served INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS questions_subject"
+                         " ON questions (subject, category, level)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS served ("
+                " user_id TEXT NOT NULL, question_id INTEGER NOT NULL, served_at REAL NOT NULL,"
+                " PRIMARY KEY (user_id, question_id))"
+            )
+
+    def add(self, subject, category, questions):
+        """Store parsed question dicts under a subject; returns how many were new"""
+        subject = normalize_subject(subject)
+        now = time.time()
+        added = 0
+        with self._transaction() as conn:
+            for q in questions:
+                data = {k: v for k, v in q.items() if k not in ('number', 'subject')}
+                data['category'] = category
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO questions (subject, category, level, fingerprint, data, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (subject, category, q.get('level', ''), question_fingerprint(q), json.dumps(data), now)
+                )
+                added += cursor.rowcount
+        return added
+
+    def available(self, subject, category, user_id=None):
+        """Questions for a subject the user has not been served yet"""
+        sql = "SELECT COUNT(*) FROM questions WHERE subject = ? AND category = ?"
+        params = [normalize_subject(subject), category]
+        if user_id is not None:
+            sql += " AND id NOT IN (SELECT question_id FROM served WHERE user_id = ?)"
+            params.append(str(user_id))
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    def pick_slots(self, slots, user_id=None):
+        """
+        Questions for every (subject, category, count) slot, chosen and marked
+        served in one transaction, so a quiz is either handed out whole or not at all
+        Questions the user has not seen come first (least served, random among
+        equals); repeats only fill what unused questions cannot
+        Returns one list per slot (shorter than count if the subject lacks questions)
+        """
+        now = time.time()
+        picked = []
+        with self._transaction() as conn:
+            for subject, category, count in slots:
+                subject = normalize_subject(subject)
+                sql = "SELECT id, data FROM questions WHERE subject = ? AND category = ?"
+                params = [subject, category]
+                if user_id is not None:
+                    sql += (" ORDER BY id IN (SELECT question_id FROM served WHERE user_id = ?),"
+                            " served, RANDOM() LIMIT ?")
+                    params += [str(user_id), count]
+                else:
+                    sql += " ORDER BY served, RANDOM() LIMIT ?"
+                    params.append(count)
+                rows = conn.execute(sql, params).fetchall()
+                conn.executemany("UPDATE questions SET served = served + 1 WHERE id = ?",
+                                 [(qid,) for qid, _ in rows])
+                if user_id is not None:
+                    conn.executemany("INSERT OR REPLACE INTO served (user_id, question_id, served_at)"
+                                     " VALUES (?, ?, ?)", [(str(user_id), qid, now) for qid, _ in rows])
+                picked.append([dict(json.loads(data), subject=subject) for _, data in rows])
+        return picked
+
+    def stats(self):
+        conn = self._connect()
+        total = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        by_subject = {}
+        for subject, category, n in conn.execute(
+                "SELECT subject, category, COUNT(*) FROM questions GROUP BY subject, category"):
+            by_subject.setdefault(subject, {})[category] = n
+        return {
+            'path': self.path,
+            'questions': total,
+            'subjects': by_subject,
+            'assembled_quizzes': self.assembled
+        }
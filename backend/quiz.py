@@ -0,0 +1,129 @@
+"""
+PeerFuse Quiz Text Helpers
+Splits Gemini quiz output into "Question N" blocks, parses them into
+typed question dicts (question, options, correctAnswer, explanation) and back
+"""
+
+import re
+
+# "Question 3 [STRENGTH - HARD]" (tolerates markdown bold/heading prefixes)
+QUESTION_HEADER = re.compile(r'^[ \t*#]*Question\s+(\d+)', re.IGNORECASE | re.MULTILINE)
+
+
+def split_complete_questions(buffer):
+    """
+    Split off question blocks that are already followed by the next header
+    Returns (blocks, remainder) where blocks are (number, text) tuples
+    """
+    headers = list(QUESTION_HEADER.finditer(buffer))
+    if len(headers) < 2:
+        return [], buffer
+    blocks = [(int(h.group(1)), buffer[h.start():n.start()].strip())
+              for h, n in zip(headers, headers[1:])]
+    return blocks, buffer[headers[-1].start():]
+
+
+def final_question(remainder):
+    """The last block once the stream has ended, or None"""
+    header = QUESTION_HEADER.search(remainder)
+    if header is None:
+        return None
+    return int(header.group(1)), remainder[header.start():].strip()
+
+
+# Pre-session quizzes: 1-10 cover strengths, 11-20 weaknesses
+PRESESSION_QUESTION_COUNT = 20
+
+DIFFICULTY_TAG = re.compile(r'\[\s*(STRENGTH|WEAKNESS)\s*(?:-\s*(EASY|MEDIUM|HARD))?\s*\]', re.IGNORECASE)
+OPTION_LINE = re.compile(r'^\**([A-D])\s*[\)\.:\-]\**\s*(.*)$', re.IGNORECASE)
+CORRECT_LINE = re.compile(r'(?:Correct\s*Answer|Answer)\**\s*[:\-]?\**\s*\(?([A-D])\b', re.IGNORECASE)
+EXPLANATION_LINE = re.compile(r'^\**Explanation\**\s*[:\-]?\**\s*(.+)$', re.IGNORECASE)
+
+
+def parse_question_block(number, block):
+    """
+    Parse one "Question N [STRENGTH/WEAKNESS - DIFFICULTY]" block into a dict
+    Returns None unless it has question text, 4 options and a correct answer
+    """
+    lines = [line.strip() for line in block.splitlines() if line.strip()]
+    if not lines:
+        return None
+
+    tag = DIFFICULTY_TAG.search(lines[0])
+    if tag:
+        category = tag.group(1).upper()
+        level = (tag.group(2) or '').upper()
+    else:
+        category = 'STRENGTH' if number <= PRESESSION_QUESTION_COUNT // 2 else 'WEAKNESS'
+        level = ''
+
+    # First line after the header (and any lone tag line) is the question text
+    body = [line for line in lines[1:] if not DIFFICULTY_TAG.fullmatch(line)]
+    if not body:
+        return None
+    question = body[0].strip('*').strip()
+
+    options = []
+    correct_answer = ''
+    explanation = ''
+    for line in body[1:]:
+        if line.startswith('---'):
+            continue
+        option = OPTION_LINE.match(line)
+        if option and not correct_answer:
+            if option.group(2).strip():
+                options.append(option.group(2).strip().strip('*').strip())
+            continue
+        correct = CORRECT_LINE.search(line)
+        if correct:
+            correct_answer = correct.group(1).upper()
+            continue
+        expl = EXPLANATION_LINE.match(line)
+        if expl:
+            explanation = expl.group(1).strip()
+
+    if not question or len(options) < 4 or not correct_answer:
+        return None
+
+    return {
+        'number': number,
+        'category': category,
+        'level': level,
+        # Same label the frontend grades on, e.g. "[STRENGTH - HARD]"
+        'difficulty': f"[{category} - {level}]" if level else f"[{category}]",
+        'question': question,
+        'options': options[:4],
+        'correctAnswer': correct_answer,
+        'explanation': explanation
+    }
+
+
+def parse_quiz(text):
+    """Parse every valid question block; returns {number: question dict}"""
+    blocks, remainder = split_complete_questions(text)
+    last = final_question(remainder)
+    if last is not None:
+        blocks.append(last)
+
+    questions = {}
+    for number, block in blocks:
+        parsed = parse_question_block(number, block)
+        # Keep the first valid copy if the model repeats a number
+        if parsed and number not in questions:
+            questions[number] = parsed
+    return questions
+
+
+def missing_questions(questions, total=PRESESSION_QUESTION_COUNT):
+    """Question numbers 1..total without a valid parse"""
+    return [n for n in range(1, total + 1) if n not in questions]
+
+
+def format_question(question):
+    """Render a question dict back into the "Question N [...]" text format"""
+    lines = [f"Question {question['number']} {question['difficulty']}", question['question']]
+    lines += [f"{letter}) {option}" for letter, option in zip('ABCD', question['options'])]
+    lines.append(f"Correct Answer: {question['correctAnswer']}")
+    if question.get('explanation'):
+        lines.append(f"Explanation: {question['explanation']}")
+    return '\n'.join(lines)
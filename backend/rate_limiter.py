@@ -0,0 +1,155 @@
+"""
+PeerFuse Gemini Rate Limiter
+Token buckets for requests-per-minute and tokens-per-minute quotas
+Waits on the asyncio loop before a call is sent and backs off adaptively on 429s
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-model quota (defaults: gemini-2.5-flash free tier)
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '10'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '250000'))
+
+# Longest a request may queue for quota before failing (seconds)
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '60'))
+
+# Retry hints in Gemini 429 errors: "Please retry in 23.5s" / "retry_delay { seconds: 23 }"
+RETRY_IN = re.compile(r'retry in\s+([\d.]+)\s*s', re.IGNORECASE)
+RETRY_DELAY = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)', re.IGNORECASE)
+
+
+class RateLimitExceeded(Exception):
+    """Quota wait would exceed the configured bound"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def retry_after_seconds(error):
+    """Server-suggested wait from a rate-limit error, or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    message = str(error)
+    for pattern in (RETRY_IN, RETRY_DELAY):
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Refills continuously up to capacity; consumption may go into debt"""
+
+    def __init__(self, capacity, per_second):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount, now, scale=1.0):
+        """Seconds until amount can be taken (amount is capped at capacity)"""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / (self.per_second * scale))
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Client-side RPM/TPM limiter for one model, used from the Gemini event loop
+    Waiters are served in arrival order; 429s pause all calls for the
+    Retry-After hint (or an exponential backoff) and slow the refill rate,
+    which recovers gradually on success
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self.max_wait = max_wait
+        self.scale = 1.0          # fraction of the nominal refill rate in use
+        self.paused_until = 0.0
+        self.backoff = 1.0
+        self.output_tokens = 1000  # running estimate of output tokens per call
+        self._lock = None
+        self.waited = 0.0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    async def acquire(self, prompt_tokens):
+        """Wait for quota; returns the token estimate charged"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        estimate = prompt_tokens + self.output_tokens
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now, self.scale),
+                           self.tokens.wait_time(estimate, now, self.scale),
+                           self.paused_until - now)
+                if wait <= 0:
+                    self.requests.consume(1, now)
+                    self.tokens.consume(estimate, now)
+                    self.waited += now - start
+                    return estimate
+                if now - start + wait > self.max_wait:
+                    self.rejected += 1
+                    raise RateLimitExceeded(f"Gemini quota busy: would wait {wait:.0f}s more")
+                await asyncio.sleep(wait)
+
+    def record_success(self, estimate, usage=None):
+        """Settle the token charge against reported usage and recover the rate"""
+        if usage:
+            prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+            output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+            total = getattr(usage, 'total_token_count', 0) or prompt_tokens + output_tokens
+            if total:
+                self.tokens.tokens += estimate - total
+            if output_tokens:
+                self.output_tokens = int(0.8 * self.output_tokens + 0.2 * output_tokens)
+        self.backoff = 1.0
+        self.scale = min(1.0, self.scale + 0.1)
+
+    def record_rate_limited(self, retry_after=None):
+        """Pause all calls and halve the refill rate after a 429"""
+        self.rate_limited += 1
+        delay = retry_after if retry_after is not None else self.backoff
+        self.backoff = min(self.backoff * 2, 60.0)
+        self.scale = max(0.25, self.scale / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        logger.info(f"Rate limited. Pausing Gemini calls for {delay:.1f}s (rate scale {self.scale:.2f})")
+        return delay
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'rpm': self.requests.capacity,
+            'tpm': self.tokens.capacity,
+            'rate_scale': round(self.scale, 2),
+            'paused_for': round(max(0.0, self.paused_until - now), 1),
+            'output_token_estimate': self.output_tokens,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected,
+            'total_wait_seconds': round(self.waited, 1)
+        }
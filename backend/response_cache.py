@@ -0,0 +1,220 @@
+"""
+PeerFuse Response Cache
+LRU cache with a byte-size budget and per-content-type TTLs
+Optional SQLite tier shared across gunicorn workers and restarts
+Keys are SHA-256 digests of the normalized prompt and model config
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_store import SQLiteStore
+
+# Hits update last_access in one batched write at most this often (seconds),
+# so readers in different workers do not queue on the WAL write lock
+ACCESS_FLUSH_INTERVAL = 30
+
+# Default time-to-live per content type (seconds)
+DEFAULT_TTLS = {
+    'notes': 24 * 3600,
+    'flashcards': 24 * 3600,
+    'quiz': 12 * 3600,
+    'presession_quiz': 6 * 3600,
+    'default': 3600
+}
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so formatting-only differences share a key"""
+    return ' '.join(prompt.split())
+
+
+def cache_key(prompt, model_config=None):
+    """Stable content-hash key (unlike hash(), identical across processes)"""
+    payload = json.dumps({'prompt': normalize_prompt(prompt), 'model': model_config or {}},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of generated text bounded by total bytes
+    Entries expire after the TTL of their content type
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttls=None):
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._entries = OrderedDict()  # key -> (text, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached text or None; refreshes recency on hit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            text, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def peek(self, key):
+        """Cached text or None without touching counters or recency (secondary reads)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, key, text, content_type='default'):
+        """Store text, evicting least recently used entries past the byte budget"""
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        ttl = self.ttls.get(content_type, self.ttls['default'])
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (text, size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class PersistentCache(SQLiteStore):
+    """
+    SQLite-backed cache tier shared by gunicorn workers and kept across restarts
+    WAL mode lets workers read while one writes; eviction is least recently used
+    once the stored text exceeds max_bytes
+    Access times of hits are buffered and written every ACCESS_FLUSH_INTERVAL
+    seconds (and before evicting), so a hit is a pure read
+    """
+
+    def __init__(self, path, max_bytes=128 * 1024 * 1024, ttls=None, access_flush_interval=ACCESS_FLUSH_INTERVAL):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.access_flush_interval = access_flush_interval
+        self._touched = {}  # key -> last hit time not yet written
+        self._touched_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL,"
+                " content_type TEXT, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def get(self, key):
+        """Cached text or None (expired rows count as misses)"""
+        now = time.time()
+        row = self._connect().execute("SELECT text, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self._touched_lock:
+            self._touched[key] = now
+            due = time.monotonic() - self._flushed_at >= self.access_flush_interval
+        if due:
+            try:
+                with self._transaction() as conn:
+                    self._flush_access(conn)
+            except Exception:
+                pass  # access times only order eviction; losing one batch is harmless
+        return row[0]
+
+    def peek(self, key):
+        """Cached text or None without touching counters or access time"""
+        row = self._connect().execute("SELECT text FROM entries WHERE key = ? AND expires_at > ?",
+                                      (key, time.time())).fetchone()
+        return row[0] if row is not None else None
+
+    def _flush_access(self, conn):
+        """Write buffered hit times (inside the caller's transaction)"""
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.monotonic()
+        if touched:
+            conn.executemany("UPDATE entries SET last_access = MAX(last_access, ?) WHERE key = ?",
+                             [(at, key) for key, at in touched.items()])
+
+    def set(self, key, text, content_type='default'):
+        """Store text and trim least recently used rows past the byte budget"""
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        ttl = self.ttls.get(content_type, self.ttls['default'])
+        with self._transaction() as conn:
+            self._flush_access(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, text, size, content_type, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, size, content_type, now + ttl, now)
+            )
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+                for old_key, old_size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                    total -= old_size
+                    self.evictions += 1
+
+    def stats(self):
+        """Counters are per process; entries/bytes are shared"""
+        entries, stored = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': stored,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,213 @@
+"""
+PeerFuse Similarity Cache
+Near-duplicate topic lookup in front of Gemini: each topic is sketched with
+MinHash over its words and character trigrams and indexed with LSH banding,
+so "newton's laws" can reuse the notes cached for "Newtons laws of motion"
+Pure Python, in process, no network; the index maps topics to cache keys
+"""
+
+import hashlib
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+# 21 bands x 3 rows: pairs with Jaccard 0.5 become candidates ~94% of the time,
+# 0.6 ~99%, while unrelated topics (Jaccard < 0.2) rarely share a bucket
+BANDS = 21
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+
+# Thresholds reported under stats()['by_threshold'] to help pick one
+REPORT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+
+# Words that do not change what a study topic is about
+STOPWORDS = frozenset({'a', 'an', 'and', 'the', 'of', 'in', 'on', 'to', 'for', 'with',
+                       'about', 'intro', 'introduction', 'basics', 'overview'})
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(20240917)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+Match = namedtuple('Match', 'key topic score')
+
+
+def topic_words(topic):
+    """ASCII-folded, lowercase, stopword-free words with a naive plural strip"""
+    text = unicodedata.normalize('NFKD', str(topic or '')).encode('ascii', 'ignore').decode().lower()
+    text = re.sub(r"['’]", '', text)
+    words = []
+    for word in re.findall(r'[a-z0-9]+', text):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return tuple(words)
+
+
+def _trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def topic_features(words):
+    """Whole words plus per-word character trigrams (tolerates typos and word order)"""
+    features = {'w:' + word for word in words}
+    for word in words:
+        features |= _trigrams(word)
+    return features
+
+
+def minhash(features):
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little')
+              for f in features]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _words_match(a, b):
+    """Same word, or a close spelling variant with the same first letter"""
+    if a == b:
+        return True
+    if a.isdigit() or b.isdigit() or a[0] != b[0] or min(len(a), len(b)) < 5:
+        return False
+    ta, tb = _trigrams(a), _trigrams(b)
+    return len(ta & tb) / len(ta | tb) >= 0.5
+
+
+def covers(query, cached):
+    """
+    The cached topic covers everything the query asks for: every query word
+    appears in it (spelling variants allowed) and both name the same numbers
+    A more specific query ("calculus 2", "integration by parts") is never
+    answered with a generic topic's notes, and "organic" / "inorganic
+    chemistry" or "World War 1" / "World War 2" stay apart
+    """
+    if {w for w in query if w.isdigit()} != {w for w in cached if w.isdigit()}:
+        return False
+    return all(any(_words_match(w, c) for c in cached) for w in query)
+
+
+class SimilarityCache:
+    """
+    LSH index of topic sketches per content type, bounded to max_entries (LRU)
+    With threshold None it only scores lookups (report-only) so by_threshold
+    hit rates can be read before enabling it
+    """
+
+    def __init__(self, threshold=None, content_types=('notes', 'flashcards'), max_entries=10000):
+        self.threshold = threshold
+        self.content_types = tuple(content_types)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (content_type, words) -> (key, topic, features, signature)
+        self._buckets = {}  # (content_type, band, band values) -> set of entry ids
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.would_hit = {t: 0 for t in REPORT_THRESHOLDS}
+
+    def _bands(self, content_type, signature):
+        for band in range(BANDS):
+            yield (content_type, band, signature[band * ROWS:(band + 1) * ROWS])
+
+    def lookup(self, content_type, topic, fetch):
+        """
+        Text cached for the closest near-duplicate topic at or above the threshold
+        fetch(key) returns the cached text or None; entries whose text is gone
+        are dropped and the next candidate is tried
+        Returns (Match, text) or None
+        """
+        if content_type not in self.content_types:
+            return None
+        words = topic_words(topic)
+        if not words:
+            return None
+        features = topic_features(words)
+        signature = minhash(features)
+
+        scored = []
+        with self._lock:
+            candidates = set()
+            for band in self._bands(content_type, signature):
+                candidates |= self._buckets.get(band, set())
+            for entry_id in candidates:
+                key, cached_topic, cached_features, _ = self._entries[entry_id]
+                if covers(words, entry_id[1]):
+                    score = len(features & cached_features) / len(features | cached_features)
+                    scored.append((score, entry_id, Match(key, cached_topic, score)))
+            scored.sort(key=lambda item: item[0], reverse=True)
+
+            self.lookups += 1
+            best = scored[0][0] if scored else 0.0
+            for t in REPORT_THRESHOLDS:
+                if best >= t:
+                    self.would_hit[t] += 1
+
+        if self.threshold is None:
+            return None
+        for score, entry_id, match in scored:
+            if score < self.threshold:
+                break
+            text = fetch(match.key)
+            with self._lock:
+                if text is None:
+                    if entry_id in self._entries:
+                        self._drop(entry_id)
+                        self.stale += 1
+                    continue
+                if entry_id in self._entries:
+                    self._entries.move_to_end(entry_id)
+                self.hits += 1
+            return match, text
+        return None
+
+    def add(self, content_type, topic, key):
+        """Index a topic whose generation is cached under key"""
+        if content_type not in self.content_types:
+            return
+        words = topic_words(topic)
+        if not words:
+            return
+        entry_id = (content_type, words)
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(entry_id)
+                return
+        features = topic_features(words)
+        signature = minhash(features)
+        with self._lock:
+            if entry_id in self._entries:
+                self._drop(entry_id)
+            self._entries[entry_id] = (key, str(topic), features, signature)
+            for band in self._bands(content_type, signature):
+                self._buckets.setdefault(band, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, entry_id):
+        _, _, _, signature = self._entries.pop(entry_id)
+        for band in self._bands(entry_id[0], signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threshold': self.threshold,
+                'content_types': list(self.content_types),
+                'entries': len(self._entries),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                'stale': self.stale,
+                'by_threshold': {
+                    str(t): {'hits': n, 'hit_rate': round(n / self.lookups, 3) if self.lookups else 0.0}
+                    for t, n in self.would_hit.items()
+                }
+            }
@@ -0,0 +1,65 @@
+"""
+PeerFuse Single-Flight
+Coalesces concurrent calls with the same key into one upstream call
+Followers wait on the leader's future and receive its result (or error)
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Per-key call deduplication for in-flight work"""
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the in-flight call
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.deduplicated = 0
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers share the result"""
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result=result)
+        return result
+
+    def begin(self, key):
+        """
+        Claim key without running anything; returns (future, leader)
+        A leader must call finish() once its work is done, whatever the outcome
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.deduplicated += 1
+        return future, leader
+
+    def finish(self, key, future, result=None, error=None):
+        """Hand a leader's result (or error) to its followers and release key"""
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with self._lock:
+            del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'upstream_calls': self.leaders,
+                'deduplicated': self.deduplicated
+            }
@@ -0,0 +1,38 @@
+"""
+PeerFuse SQLite Store
+Shared base for the on-disk stores used by all gunicorn workers
+(persistent cache, question bank, job records): one WAL-mode connection per
+thread, autocommit reads and explicit BEGIN IMMEDIATE write transactions
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread; sqlite connections are not shareable
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding the database write lock until commit"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
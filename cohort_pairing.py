@@ -0,0 +1,140 @@
+"""
+PeerFuse Cohort Pairing Solver
+Pairs a whole cohort at once instead of ranking candidates one user at a time
+Uses the calculate_match_score semantics from simulate_matching.py
+"""
+
+import random
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("Cohort pairing needs NumPy (pip install numpy)") from e
+
+from simulate_matching import CompactCohort, ScoreStats, WEIGHT_CONFIGS
+from simulate_matching_numpy import encode_users, score_matrix, BLOCK_PAIRS
+
+# Candidates kept per user in the pruned graph
+DEFAULT_CANDIDATES = 20
+
+
+def candidate_edges(cohort, weights, enable_negative_marking=False, candidates=DEFAULT_CANDIDATES):
+    """
+    Pruned candidate graph: each user's top-N viable partners (>= 1 comp skill)
+    Returns (i, j, score) arrays with i < j, each undirected edge once
+    """
+    codes, strengths, weaknesses = encode_users(cohort)
+    n = len(cohort)
+    keep = min(candidates, max(n - 1, 0))
+    if keep == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    edge_i, edge_j, edge_score = [], [], []
+    block_rows = max(1, BLOCK_PAIRS // max(n, 1))
+    for r0 in range(0, n, block_rows):
+        r1 = min(r0 + block_rows, n)
+        score, comp = score_matrix(codes, strengths, weaknesses, (r0, r1), (0, n), weights,
+                                   enable_negative_marking)
+        score = score.astype(np.float64)
+
+        # HARD REQUIREMENT: Only pair users with at least 1 complementary skill
+        score[comp == 0] = -np.inf
+        score[np.arange(r1 - r0), np.arange(r0, r1)] = -np.inf
+
+        top = np.argpartition(-score, keep - 1, axis=1)[:, :keep]
+        rows = np.repeat(np.arange(r0, r1), keep)
+        cols = top.ravel()
+        values = score[rows - r0, cols]
+        viable = np.isfinite(values)
+        edge_i.append(rows[viable])
+        edge_j.append(cols[viable])
+        edge_score.append(values[viable])
+
+    i = np.concatenate(edge_i)
+    j = np.concatenate(edge_j)
+    scores = np.concatenate(edge_score)
+
+    # Undirected: keep each (min, max) pair once
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    _, unique = np.unique(lo * n + hi, return_index=True)
+    return lo[unique], hi[unique], scores[unique]
+
+
+def stable_pairing(num_users, edge_i, edge_j, edge_score):
+    """
+    Greedy pairing over edges in descending score order
+    Scores are symmetric, so the result is a stable roommates matching on the
+    candidate graph: no two users both prefer each other over their partners
+    Returns a list of (i, j, score)
+    """
+    # Highest score first; ties broken by user index for determinism
+    order = np.lexsort((edge_j, edge_i, -edge_score))
+    partner = np.full(num_users, -1, dtype=np.int64)
+    pairs = []
+    for e in order:
+        i, j = edge_i[e], edge_j[e]
+        if partner[i] < 0 and partner[j] < 0:
+            partner[i] = j
+            partner[j] = i
+            pairs.append((int(i), int(j), edge_score[e]))
+    return pairs
+
+
+def pair_cohort(config, num_users=500, candidates=DEFAULT_CANDIDATES):
+    """
+    Pair a generated cohort under a weight configuration
+    Returns the tier stats of the chosen pairs plus matched % and mean score
+    """
+    weights = config['weights']
+    enable_negative_marking = config.get('negative_marking', False)
+
+    # Same cohort as simulate_matching_with_config
+    random.seed(42)
+    cohort = CompactCohort.generate(num_users)
+
+    edge_i, edge_j, edge_score = candidate_edges(cohort, weights, enable_negative_marking, candidates)
+    pairs = stable_pairing(len(cohort), edge_i, edge_j, edge_score)
+
+    stats = ScoreStats()
+    for i, j, score in pairs:
+        comp = ((cohort.weaknesses[i] & cohort.strengths[j]).bit_count()
+                + (cohort.weaknesses[j] & cohort.strengths[i]).bit_count())
+        stats.add(score if enable_negative_marking else int(score), comp)
+
+    result = stats.summary(config['name']) if pairs else {'config_name': config['name']}
+    result.update({
+        'num_pairs': len(pairs),
+        'matched_pct': round(2 * len(pairs) / max(num_users, 1) * 100, 1),
+        'mean_pair_score': round(sum(p[2] for p in pairs) / len(pairs), 1) if pairs else 0.0,
+        'candidate_edges': len(edge_score)
+    })
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PeerFuse cohort pairing solver')
+    parser.add_argument('--users', type=int, default=500, help='Cohort size')
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES,
+                        help='Top candidates kept per user in the pruned graph')
+    parser.add_argument('--config', default=WEIGHT_CONFIGS[0]['name'], help='Weight configuration name')
+    args = parser.parse_args()
+
+    config = next(c for c in WEIGHT_CONFIGS if c['name'] == args.config)
+    r = pair_cohort(config, num_users=args.users, candidates=args.candidates)
+
+    print("\n" + "="*90)
+    print(f"COHORT PAIRING: {r['config_name']} ({args.users} users, {args.candidates} candidates each)")
+    print("="*90)
+    print(f"  Pairs formed         : {r['num_pairs']}")
+    print(f"  Matched Users        : {r['matched_pct']:.1f}%")
+    print(f"  Mean Pair Score      : {r['mean_pair_score']:.1f}")
+    if r['num_pairs']:
+        print(f"  Median Score         : {r['median_score']}")
+        print(f"  Score Range          : {r['lowest_score']} to {r['highest_score']}")
+        print(f"  Usable Pairs (≥80)   : {r['usable_80_pct']:.1f}%")
+        print(f"  Recommended (≥120)   : {r['recommended_120_pct']:.1f}%")
+        print(f"  Excellent (≥150)     : {r['excellent_pct']:.1f}%")
+        print(f"  Avg Comp Skills      : {r['avg_comp']:.2f}")
+    print("="*90 + "\n")
@@ -7,6 +7,9 @@
 const BACKEND_URL = 'https://peerfuse-1.onrender.com';
 let backendAvailable = false;
 
+// Last response per type and topic; the backend answers 304 when it is unchanged
+const generatedCache = new Map();
+
 /**
  * Check if backend is running
  */
@@ -415,17 +418,32 @@ async function generateContent(type) {
   try {
     console.log(`Fetching ${type} for topic: ${topic}`);
     
+    const cacheKey = `${type}:${topic}`;
+    const previous = generatedCache.get(cacheKey);
+    const headers = { 'Content-Type': 'application/json' };
+    if (previous) {
+      headers['If-None-Match'] = previous.etag;
+    }
+
     const response = await fetch(`${BACKEND_URL}/generate-${type}`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers,
       body: JSON.stringify({ topic })
     });
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+    let data;
+    if (response.status === 304 && previous) {
+      data = previous.data;
+    } else {
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      data = await response.json();
+      const etag = response.headers.get('ETag');
+      if (etag) {
+        generatedCache.set(cacheKey, { etag, data });
+      }
     }
-
-    const data = await response.json();
     console.log(`Received ${type} response:`, data);
     
     // Convert Markdown to HTML and show in modal
@@ -756,21 +756,30 @@ async function handleStartPreQuiz() {
     statusDiv.className = 'status';
     window.UI.show('prequiz-status');
 
-    // Generate quiz via backend
-    const response = await fetch('https://peerfuse-1.onrender.com/generate-presession-quiz', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        strengths: profile.strengths || [],
-        weaknesses: profile.weaknesses || []
-      })
-    });
+    // Generate quiz via backend as a background job (no long-held request)
+    const requestQuiz = async (background) => {
+      const response = await fetch('https://peerfuse-1.onrender.com/generate-presession-quiz', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          strengths: profile.strengths || [],
+          weaknesses: profile.weaknesses || [],
+          userId: userKey,
+          async: background
+        })
+      });
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      return response.json();
+    };
 
-    const data = await response.json();
+    let data = await requestQuiz(true);
+    if (data.jobId) {
+      // A job lost to a server restart is retried as a plain request
+      data = await waitForJob('https://peerfuse-1.onrender.com', data.jobId, () => requestQuiz(false));
+    }
     
     console.log('🎯 Quiz API response:', data);
     
@@ -778,8 +787,8 @@ async function handleStartPreQuiz() {
       throw new Error('No quiz content returned from API');
     }
     
-    // Parse and display questions
-    displayPreQuizQuestions(data.content);
+    // Display server-parsed questions (raw content is the fallback)
+    displayPreQuizQuestions(data.content, data.questions);
     
     // Switch views
     window.UI.hide('prequiz-start');
@@ -851,16 +860,45 @@ function cleanGeminiText(text) {
   return cleaned;
 }
 
+/**
+ * Long-poll a backend job until it finishes; resolves with its result
+ * If the job is unknown (404) or was interrupted by a server restart,
+ * resolves with fallback() instead when one is given
+ */
+async function waitForJob(baseUrl, jobId, fallback) {
+  while (true) {
+    const response = await fetch(`${baseUrl}/jobs/${jobId}?wait=20`);
+    if (response.status === 404 && fallback) {
+      return fallback();
+    }
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const job = await response.json();
+    if (job.status === 'done') {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      if (job.interrupted && fallback) {
+        return fallback();
+      }
+      throw new Error(job.error || 'Quiz generation failed');
+    }
+  }
+}
+
 /**
  * Display pre-quiz questions
  */
-function displayPreQuizQuestions(quizContent) {
+function displayPreQuizQuestions(quizContent, parsedQuestions) {
   const questionsDiv = document.getElementById('prequiz-questions');
   
   console.log('🔍 Quiz content received:', quizContent);
   
-  // Parse the quiz content
-  const questions = parseQuizContent(quizContent);
+  // Prefer the backend's structured questions; parse the raw text otherwise
+  const questions = Array.isArray(parsedQuestions) && parsedQuestions.length > 0
+    ? parsedQuestions
+    : parseQuizContent(quizContent);
   
   console.log('✅ Parsed questions:', questions.length, questions);
   
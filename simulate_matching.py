@@ -5,6 +5,7 @@ Tests multiple weight configurations to find optimal balance
 
 import random
 import json
+from array import array
 from collections import defaultdict
 
 # Weight configurations to test (30 variations)
@@ -267,74 +268,270 @@ def calculate_match_score(user_a, user_b, weights, enable_negative_marking=False
     
     return score, comp_matches
 
-def simulate_matching_with_config(config, num_users=500):
+# ============================================================================
+# COMPACT USER RECORDS
+# ============================================================================
+# Categorical fields are interned to small ints and strengths/weaknesses are
+# stored as subject bitmasks, so scoring compares ints and ANDs masks instead
+# of comparing strings and building four sets for every pair.
+
+SUBJECT_BITS = {subject: 1 << i for i, subject in enumerate(SUBJECTS)}
+
+# Field -> {option value: code}; values outside the option lists get new codes
+FIELD_CODES = {
+    'availability': {v: i for i, v in enumerate(AVAILABILITY_OPTIONS)},
+    'preferredMode': {v: i for i, v in enumerate(MODE_OPTIONS)},
+    'primaryGoal': {v: i for i, v in enumerate(GOAL_OPTIONS)},
+    'preferredFrequency': {v: i for i, v in enumerate(FREQUENCY_OPTIONS)},
+    'partnerPreference': {v: i for i, v in enumerate(PARTNER_PREF_OPTIONS)},
+    'sessionLength': {v: i for i, v in enumerate(SESSION_LENGTH_OPTIONS)},
+    'timeZone': {v: i for i, v in enumerate(TIMEZONE_OPTIONS)},
+    'studyPersonality': {v: i for i, v in enumerate(PERSONALITY_OPTIONS)}
+}
+
+# Categorical fields in calculate_match_score order
+CATEGORICAL_FIELDS = list(FIELD_CODES)
+
+
+def subject_mask(subjects):
+    """Bitmask of a list of subject names"""
+    mask = 0
+    for subject in subjects:
+        mask |= SUBJECT_BITS.setdefault(subject, 1 << len(SUBJECT_BITS))
+    return mask
+
+
+class CompactCohort:
+    """
+    Struct-of-arrays cohort: one byte per categorical field per user plus
+    two subject bitmask words (~20 bytes/user instead of a dict of strings)
+    """
+    __slots__ = ('ids', 'strengths', 'weaknesses', 'codes')
+
+    def __init__(self):
+        self.ids = array('L')
+        self.strengths = array('L')
+        self.weaknesses = array('L')
+        self.codes = {field: array('B') for field in CATEGORICAL_FIELDS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, user):
+        """Encode and append a generate_user() style profile dict"""
+        self.ids.append(user['id'])
+        self.strengths.append(subject_mask(user['strengths']))
+        self.weaknesses.append(subject_mask(user['weaknesses']))
+        for field in CATEGORICAL_FIELDS:
+            codes = FIELD_CODES[field]
+            self.codes[field].append(codes.setdefault(user[field], len(codes)))
+
+    @classmethod
+    def generate(cls, num_users):
+        """Generate users 1..num_users (same random stream as generate_user)"""
+        cohort = cls()
+        for i in range(1, num_users + 1):
+            cohort.append(generate_user(i))
+        return cohort
+
+
+def calculate_cohort_match_score(cohort, i, j, weights, enable_negative_marking=False):
+    """calculate_match_score for users i and j of a CompactCohort (same rules and results)"""
+    # Complementary skills: A's weaknesses B teaches + B's weaknesses A teaches
+    comp_matches = ((cohort.weaknesses[i] & cohort.strengths[j]).bit_count()
+                    + (cohort.weaknesses[j] & cohort.strengths[i]).bit_count())
+    score = comp_matches * weights['compPerMatch']
+    match_count = 0
+
+    # Scores are integers or half-integers, so summation order doesn't change them
+    for field, codes in cohort.codes.items():
+        if codes[i] == codes[j]:
+            score += weights[field]
+            match_count += 1
+        elif enable_negative_marking:
+            score -= weights[field] * 0.5
+
+    # PENALTY: If only 1 factor matches out of all (9 total factors), subtract 50
+    if match_count == 1:
+        score -= 50
+
+    return score, comp_matches
+
+
+class ScoreStats:
+    """
+    Streaming statistics over scored pairs (constant memory, no sort)
+    Scores are integers or half-integers, so a histogram keyed by the doubled
+    score is exact: mean, median, range and tiers all come from the bins
+    """
+
+    def __init__(self):
+        self.histogram = defaultdict(int)  # doubled score -> pair count
+        self.count = 0
+        self.comp_total = 0
+        self.zero_comp = 0
+        self.float_scores = False  # negative marking produces float scores
+
+    def add(self, score, comp_matches):
+        """Record one pair"""
+        self.histogram[int(score * 2)] += 1
+        self.count += 1
+        self.comp_total += comp_matches
+        if comp_matches == 0:
+            self.zero_comp += 1
+        if isinstance(score, float):
+            self.float_scores = True
+
+    def add_counts(self, doubled_scores, counts, comp_total, float_scores=False):
+        """Record many pairs at once from (doubled score, pair count) bins"""
+        for doubled, count in zip(doubled_scores, counts):
+            self.histogram[int(doubled)] += int(count)
+            self.count += int(count)
+        self.comp_total += int(comp_total)
+        self.float_scores = self.float_scores or float_scores
+
+    def merge(self, other):
+        """Fold another accumulator into this one (order independent)"""
+        for doubled, count in other.histogram.items():
+            self.histogram[doubled] += count
+        self.count += other.count
+        self.comp_total += other.comp_total
+        self.zero_comp += other.zero_comp
+        self.float_scores = self.float_scores or other.float_scores
+        return self
+
+    def _score(self, doubled):
+        return doubled / 2 if self.float_scores else doubled // 2
+
+    def summary(self, config_name):
+        """Result dict for simulate_matching_with_config"""
+        total = self.count
+        bins = sorted(self.histogram.items(), reverse=True)
+
+        # Median is scores[len // 2] of the descending order
+        median_rank = total // 2
+        seen = 0
+        for doubled, count in bins:
+            seen += count
+            if seen > median_rank:
+                median_score = self._score(doubled)
+                break
+
+        def count_where(predicate):
+            return sum(count for doubled, count in bins if predicate(doubled / 2))
+
+        avg_score = (sum(doubled * count for doubled, count in bins) / 2) / total
+
+        # Count quality tiers
+        excellent = count_where(lambda s: s >= 150)
+        great = count_where(lambda s: 120 <= s < 150)
+        good = count_where(lambda s: 100 <= s < 120)
+        fair = count_where(lambda s: 80 <= s < 100)
+        poor = count_where(lambda s: 50 <= s < 80)
+        unusable = count_where(lambda s: s < 50)
+
+        # Usability metrics
+        usable_80 = count_where(lambda s: s >= 80)
+        recommended_120 = count_where(lambda s: s >= 120)
+
+        return {
+            'config_name': config_name,
+            'avg_score': round(avg_score, 1),
+            'median_score': median_score,
+            'highest_score': self._score(bins[0][0]),
+            'lowest_score': self._score(bins[-1][0]),
+            'excellent_pct': round(excellent / total * 100, 1),
+            'great_pct': round(great / total * 100, 1),
+            'good_pct': round(good / total * 100, 1),
+            'fair_pct': round(fair / total * 100, 1),
+            'poor_pct': round(poor / total * 100, 1),
+            'unusable_pct': round(unusable / total * 100, 1),
+            'usable_80_pct': round(usable_80 / total * 100, 1),
+            'recommended_120_pct': round(recommended_120 / total * 100, 1),
+            'avg_comp': round(self.comp_total / total, 2),
+            'zero_comp_pct': round(self.zero_comp / total * 100, 1)
+        }
+
+
+def score_pair_rows(cohort, weights, enable_negative_marking, start, stop):
+    """Score pairs (i, j) for start <= i < stop and j > i into a ScoreStats"""
+    stats = ScoreStats()
+    for i in range(start, stop):
+        for j in range(i + 1, len(cohort)):
+            score, comp_matches = calculate_cohort_match_score(cohort, i, j, weights, enable_negative_marking)
+            # HARD REQUIREMENT: Only include pairs with at least 1 complementary skill
+            if comp_matches > 0:
+                stats.add(score, comp_matches)
+    return stats
+
+
+def balanced_row_chunks(num_users, num_chunks):
+    """
+    Split the triangular i-range into contiguous chunks with ~equal pair counts
+    Row i has (num_users - 1 - i) pairs, so early chunks hold fewer rows
+    """
+    total_pairs = num_users * (num_users - 1) // 2
+    target = total_pairs / max(num_chunks, 1)
+    chunks = []
+    start = 0
+    pairs = 0
+    for i in range(num_users):
+        pairs += num_users - 1 - i
+        if pairs >= target * (len(chunks) + 1) and len(chunks) < num_chunks - 1:
+            chunks.append((start, i + 1))
+            start = i + 1
+    if start < num_users:
+        chunks.append((start, num_users))
+    return chunks
+
+
+# Per-process state for sharded scoring (set once by the pool initializer)
+_worker_state = {}
+
+
+def _init_worker(users, weights, enable_negative_marking):
+    _worker_state['args'] = (users, weights, enable_negative_marking)
+
+
+def _score_chunk(chunk):
+    return score_pair_rows(*_worker_state['args'], *chunk)
+
+
+def simulate_matching_with_config(config, num_users=500, workers=1):
     """Simulate matching process for N users with specific weight configuration"""
     weights = config['weights']
     enable_negative_marking = config.get('negative_marking', False)
     
     # Generate users (use fixed seed for reproducibility across configs)
     random.seed(42)
-    users = [generate_user(i) for i in range(1, num_users + 1)]
-    
-    # Calculate all possible pair scores
-    all_pairs = []
-    for i in range(len(users)):
-        for j in range(i + 1, len(users)):
-            score, comp_matches = calculate_match_score(users[i], users[j], weights, enable_negative_marking)
-            # HARD REQUIREMENT: Only include pairs with at least 1 complementary skill
-            if comp_matches > 0:
-                all_pairs.append({
-                    'score': score,
-                    'comp_matches': comp_matches
-                })
-    
-    # Sort by score
-    all_pairs.sort(key=lambda x: x['score'], reverse=True)
-    
-    # Calculate statistics
-    scores = [p['score'] for p in all_pairs]
-    avg_score = sum(scores) / len(scores)
-    median_score = scores[len(scores) // 2]
-    highest_score = max(scores)
-    lowest_score = min(scores)
-    
-    # Count quality tiers
-    excellent = sum(1 for s in scores if s >= 150)
-    great = sum(1 for s in scores if 120 <= s < 150)
-    good = sum(1 for s in scores if 100 <= s < 120)
-    fair = sum(1 for s in scores if 80 <= s < 100)
-    poor = sum(1 for s in scores if 50 <= s < 80)
-    unusable = sum(1 for s in scores if s < 50)
-    
-    # Usability metrics
-    usable_80 = sum(1 for s in scores if s >= 80)
-    recommended_120 = sum(1 for s in scores if s >= 120)
-    
-    # Complementary matches
-    comp_counts = [p['comp_matches'] for p in all_pairs]
-    avg_comp = sum(comp_counts) / len(comp_counts)
-    zero_comp = sum(1 for c in comp_counts if c == 0)
+    users = CompactCohort.generate(num_users)
     
-    return {
-        'config_name': config['name'],
-        'avg_score': round(avg_score, 1),
-        'median_score': median_score,
-        'highest_score': highest_score,
-        'lowest_score': lowest_score,
-        'excellent_pct': round(excellent / len(scores) * 100, 1),
-        'great_pct': round(great / len(scores) * 100, 1),
-        'good_pct': round(good / len(scores) * 100, 1),
-        'fair_pct': round(fair / len(scores) * 100, 1),
-        'poor_pct': round(poor / len(scores) * 100, 1),
-        'unusable_pct': round(unusable / len(scores) * 100, 1),
-        'usable_80_pct': round(usable_80 / len(scores) * 100, 1),
-        'recommended_120_pct': round(recommended_120 / len(scores) * 100, 1),
-        'avg_comp': round(avg_comp, 2),
-        'zero_comp_pct': round(zero_comp / len(scores) * 100, 1)
-    }
+    # Score all possible pairs into a streaming accumulator
+    if workers <= 1:
+        stats = score_pair_rows(users, weights, enable_negative_marking, 0, len(users))
+    else:
+        from multiprocessing import Pool
+
+        # Several chunks per worker so stragglers don't idle the pool
+        chunks = balanced_row_chunks(len(users), workers * 4)
+        stats = ScoreStats()
+        with Pool(workers, initializer=_init_worker,
+                  initargs=(users, weights, enable_negative_marking)) as pool:
+            for partial in pool.imap_unordered(_score_chunk, chunks):
+                stats.merge(partial)
+    
+    return stats.summary(config['name'])
+
 
+def get_simulator(engine='python'):
+    """Return the simulate function for the requested engine ('python' or 'numpy')"""
+    if engine == 'numpy':
+        from simulate_matching_numpy import simulate_matching_vectorized
+        return simulate_matching_vectorized
+    return simulate_matching_with_config
 
-def run_all_simulations():
+
+def run_all_simulations(engine='python', workers=1):
     """Run simulations for all weight configurations with extensive analysis"""
     print("\n" + "="*90)
     print("WEIGHT CONFIGURATION COMPARISON - 30 VARIATIONS")
@@ -344,11 +541,21 @@ def run_all_simulations():
     # Filter out negative marking config (if any)
     configs_to_test = [c for c in WEIGHT_CONFIGS if not c.get('negative_marking', False)]
     
-    results = []
-    for i, config in enumerate(configs_to_test, 1):
-        print(f"Running simulation {i}/{len(configs_to_test)}: {config['name']}...")
-        result = simulate_matching_with_config(config, num_users=500)
-        results.append(result)
+    if engine == 'batch':
+        # One shared pair feature pass scores every config at once
+        from simulate_matching_numpy import simulate_all_configs
+        print(f"Running {len(configs_to_test)} simulations in one pass...")
+        results = simulate_all_configs(configs_to_test, num_users=500)
+    else:
+        simulate = get_simulator(engine)
+        results = []
+        for i, config in enumerate(configs_to_test, 1):
+            print(f"Running simulation {i}/{len(configs_to_test)}: {config['name']}...")
+            if engine == 'python':
+                result = simulate(config, num_users=500, workers=workers)
+            else:
+                result = simulate(config, num_users=500)
+            results.append(result)
     
     print("\n✅ All simulations complete!\n")
     
@@ -682,4 +889,19 @@ def run_all_simulations():
 
 
 if __name__ == "__main__":
-    run_all_simulations()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PeerFuse matching weight simulation')
+    parser.add_argument('--engine', choices=['python', 'numpy', 'batch'], default='python',
+                        help='Pair scoring engine (numpy scores the pair matrix in blocks, '
+                             'batch scores all configs from one shared feature pass)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for sharded pair scoring (python engine only)')
+    args = parser.parse_args()
+    if args.engine != 'python':
+        try:
+            import simulate_matching_numpy  # noqa: F401
+        except ImportError as e:
+            parser.error(str(e))
+
+    run_all_simulations(engine=args.engine, workers=args.workers)
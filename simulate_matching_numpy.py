@@ -0,0 +1,209 @@
+"""
+PeerFuse Matching Simulation - Vectorized NumPy Engine
+Scores the whole upper triangle of the pair matrix in blocked array operations
+Produces the same statistics as simulate_matching.simulate_matching_with_config
+"""
+
+import random
+
+try:
+    import numpy as np
+except ImportError as e:  # optional; the default python engine runs without it
+    raise ImportError("The numpy and batch engines need NumPy (pip install numpy)") from e
+
+from simulate_matching import CompactCohort, ScoreStats, CATEGORICAL_FIELDS, SUBJECTS
+
+# Popcount lookup table for 16-bit subject masks
+POPCOUNT_16 = np.array([bin(i).count('1') for i in range(1 << 16)], dtype=np.int8)
+
+# Target number of pair cells scored per block (bounds peak memory)
+BLOCK_PAIRS = 2_000_000
+
+
+def encode_users(cohort):
+    """
+    View a CompactCohort as arrays: one int code row per categorical field
+    plus uint16 subject bitmasks for strengths and weaknesses
+    """
+    if len(SUBJECTS) > 16:
+        raise ValueError("Subject bitmasks support at most 16 subjects")
+
+    codes = np.array([np.frombuffer(cohort.codes[field], dtype=np.uint8) for field in CATEGORICAL_FIELDS],
+                     dtype=np.int16).reshape(len(CATEGORICAL_FIELDS), len(cohort))
+    strengths = np.array(cohort.strengths, dtype=np.uint16)
+    weaknesses = np.array(cohort.weaknesses, dtype=np.uint16)
+    return codes, strengths, weaknesses
+
+
+def score_matrix(codes, strengths, weaknesses, rows, cols, weights, enable_negative_marking=False):
+    """
+    Score users rows[0]..rows[1]-1 against cols[0]..cols[1]-1
+    Returns (scores, comp_matches) as (len(rows), len(cols)) arrays
+    """
+    r0, r1 = rows
+    c0, c1 = cols
+
+    # Complementary skills: |A.weak & B.strong| + |B.weak & A.strong|
+    comp = (POPCOUNT_16[weaknesses[r0:r1, None] & strengths[None, c0:c1]]
+            + POPCOUNT_16[strengths[r0:r1, None] & weaknesses[None, c0:c1]])
+
+    dtype = np.float64 if enable_negative_marking else np.int32
+    score = comp.astype(dtype) * weights['compPerMatch']
+    match_count = np.zeros(comp.shape, dtype=np.int8)
+
+    for f, field in enumerate(CATEGORICAL_FIELDS):
+        matched = codes[f, r0:r1, None] == codes[f, None, c0:c1]
+        match_count += matched
+        if enable_negative_marking:
+            score += np.where(matched, weights[field], -weights[field] * 0.5)
+        else:
+            score += matched * weights[field]
+
+    # PENALTY: only 1 factor matches
+    score -= (match_count == 1) * 50
+
+    return score, comp
+
+
+def score_block(codes, strengths, weaknesses, rows, weights, enable_negative_marking=False):
+    """
+    Score rows[0]..rows[-1] against every later user (upper triangle only)
+    Returns (scores, comp_matches) as flat arrays of the pairs in row-major order
+    """
+    r0, r1 = rows
+    n = codes.shape[1]
+    upper = np.arange(r0 + 1, n)[None, :] > np.arange(r0, r1)[:, None]
+    score, comp = score_matrix(codes, strengths, weaknesses, rows, (r0 + 1, n), weights,
+                               enable_negative_marking)
+    return score[upper], comp[upper]
+
+
+def _score_histogram(config, users):
+    """Accumulate an exact histogram of doubled scores over all viable pairs"""
+    weights = config['weights']
+    enable_negative_marking = config.get('negative_marking', False)
+    codes, strengths, weaknesses = encode_users(users)
+    n = len(users)
+
+    # Doubled scores are integers, so bins are exact for half-point penalties
+    categorical_total = sum(weights[f] for f in CATEGORICAL_FIELDS)
+    max_comp = 2 * len(SUBJECTS)
+    low = -categorical_total - 100 if enable_negative_marking else -100
+    high = 2 * categorical_total + 2 * max_comp * weights['compPerMatch']
+
+    histogram = np.zeros(high - low + 1, dtype=np.int64)
+    comp_total = 0
+
+    block_rows = max(1, BLOCK_PAIRS // max(n, 1))
+    for r0 in range(0, n - 1, block_rows):
+        r1 = min(r0 + block_rows, n - 1)
+        scores, comp = score_block(codes, strengths, weaknesses, (r0, r1), weights,
+                                   enable_negative_marking)
+        # HARD REQUIREMENT: Only include pairs with at least 1 complementary skill
+        viable = comp > 0
+        doubled = (scores[viable] * 2).astype(np.int64) - low
+        histogram += np.bincount(doubled, minlength=histogram.size)
+        comp_total += int(comp[viable].sum(dtype=np.int64))
+
+    return histogram, low, comp_total
+
+
+def _generate_users(num_users):
+    """Generate users exactly like the reference engine"""
+    random.seed(42)
+    return CompactCohort.generate(num_users)
+
+
+def simulate_matching_vectorized(config, num_users=500):
+    """Vectorized equivalent of simulate_matching_with_config"""
+    users = _generate_users(num_users)
+    histogram, low, comp_total = _score_histogram(config, users)
+
+    nonzero = np.nonzero(histogram)[0]
+    stats = ScoreStats()
+    stats.add_counts(nonzero + low, histogram[nonzero], comp_total,
+                     float_scores=config.get('negative_marking', False))
+    return stats.summary(config['name'])
+
+
+# ============================================================================
+# ALL CONFIGS IN ONE PASS
+# ============================================================================
+# A pair's score only depends on which categorical factors matched and on its
+# comp count. Pairs are reduced once to counts of (factor bits, comp) patterns;
+# every config is then scored with a single patterns x weights matrix product.
+
+def pair_feature_counts(users):
+    """
+    Count viable pairs per feature pattern
+    Returns (features, counts): features rows are [matched factors..., comp, single_factor, 1]
+    """
+    codes, strengths, weaknesses = encode_users(users)
+    n = len(users)
+    num_fields = len(CATEGORICAL_FIELDS)
+    max_comp = 2 * len(SUBJECTS)
+    pattern_counts = np.zeros((max_comp + 1) << num_fields, dtype=np.int64)
+
+    block_rows = max(1, BLOCK_PAIRS // max(n, 1))
+    for r0 in range(0, n - 1, block_rows):
+        r1 = min(r0 + block_rows, n - 1)
+        row_idx = np.arange(r0, r1)[:, None]
+        upper = np.arange(r0 + 1, n)[None, :] > row_idx
+
+        comp = (POPCOUNT_16[weaknesses[r0:r1, None] & strengths[None, r0 + 1:]]
+                + POPCOUNT_16[strengths[r0:r1, None] & weaknesses[None, r0 + 1:]])
+        pattern = comp.astype(np.int32) << num_fields
+        for f in range(num_fields):
+            pattern |= (codes[f, r0:r1, None] == codes[f, None, r0 + 1:]).astype(np.int32) << f
+
+        # HARD REQUIREMENT: Only include pairs with at least 1 complementary skill
+        viable = upper & (comp > 0)
+        pattern_counts += np.bincount(pattern[viable], minlength=pattern_counts.size)
+
+    present = np.nonzero(pattern_counts)[0]
+    bits = (present[:, None] >> np.arange(num_fields)) & 1
+    comp = present >> num_fields
+    single_factor = bits.sum(axis=1) == 1
+    features = np.column_stack([bits, comp, single_factor, np.ones(len(present), dtype=np.int64)])
+    return features.astype(np.int64), pattern_counts[present]
+
+
+def doubled_weights_matrix(configs):
+    """
+    Doubled per-feature weights, one column per config (matches pair_feature_counts rows)
+    Negative marking folds the -50% mismatch penalty into the factor weight and bias
+    """
+    matrix = np.zeros((len(CATEGORICAL_FIELDS) + 3, len(configs)), dtype=np.int64)
+    for k, config in enumerate(configs):
+        weights = config['weights']
+        factor_weights = [weights[f] for f in CATEGORICAL_FIELDS]
+        if config.get('negative_marking', False):
+            # matched: +w, unmatched: -w/2  ->  1.5w * matched - w/2
+            matrix[:len(factor_weights), k] = [3 * w for w in factor_weights]
+            matrix[-1, k] = -sum(factor_weights)
+        else:
+            matrix[:len(factor_weights), k] = [2 * w for w in factor_weights]
+        matrix[-3, k] = 2 * weights['compPerMatch']
+        matrix[-2, k] = -100
+    return matrix
+
+
+def simulate_all_configs(configs, num_users=500):
+    """Score every config over one shared pair feature pass; returns one result per config"""
+    users = _generate_users(num_users)
+    features, counts = pair_feature_counts(users)
+    comp_total = int((features[:, len(CATEGORICAL_FIELDS)] * counts).sum())
+
+    doubled_scores = features @ doubled_weights_matrix(configs)
+
+    results = []
+    for k, config in enumerate(configs):
+        doubled_values, inverse = np.unique(doubled_scores[:, k], return_inverse=True)
+        # Sum pair counts (not pattern occurrences) per distinct score
+        value_counts = np.zeros(len(doubled_values), dtype=np.int64)
+        np.add.at(value_counts, inverse, counts)
+        stats = ScoreStats()
+        stats.add_counts(doubled_values, value_counts, comp_total,
+                         float_scores=config.get('negative_marking', False))
+        results.append(stats.summary(config['name']))
+    return results
@@ -0,0 +1,51 @@
+"""
+TEST: Cohort pairing solver
+With an unpruned candidate graph the pairing must be a valid, stable matching
+"""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from simulate_matching import calculate_cohort_match_score, CompactCohort, WEIGHT_CONFIGS
+from cohort_pairing import candidate_edges, stable_pairing, pair_cohort
+
+
+def test_pairing_is_stable_on_full_graph():
+    weights = WEIGHT_CONFIGS[0]['weights']
+    random.seed(11)
+    cohort = CompactCohort.generate(80)
+    edge_i, edge_j, edge_score = candidate_edges(cohort, weights, candidates=len(cohort))
+    pairs = stable_pairing(len(cohort), edge_i, edge_j, edge_score)
+
+    partner_score = {}
+    for i, j, score in pairs:
+        assert i not in partner_score and j not in partner_score
+        assert calculate_cohort_match_score(cohort, i, j, weights)[0] == score
+        partner_score[i] = partner_score[j] = score
+
+    # No blocking pair: two users who both score each other above their partners
+    for i in range(len(cohort)):
+        for j in range(i + 1, len(cohort)):
+            score, comp = calculate_cohort_match_score(cohort, i, j, weights)
+            if comp > 0:
+                assert not (score > partner_score.get(i, float('-inf'))
+                            and score > partner_score.get(j, float('-inf')))
+
+
+def test_pair_cohort_reports_match_rate():
+    result = pair_cohort(WEIGHT_CONFIGS[0], num_users=200, candidates=10)
+    assert 0 < result['matched_pct'] <= 100
+    assert result['num_pairs'] * 2 <= 200
+    assert result['lowest_score'] <= result['mean_pair_score'] <= result['highest_score']
+
+
+if __name__ == '__main__':
+    test_pairing_is_stable_on_full_graph()
+    test_pair_cohort_reports_match_rate()
+    print("✅ Cohort pairing is valid and stable")
@@ -0,0 +1,48 @@
+"""
+TEST: Compact struct-of-arrays cohort
+Scoring interned codes and subject bitmasks must match calculate_match_score on the dicts
+"""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulate_matching import (calculate_match_score, calculate_cohort_match_score, generate_user,
+                               CompactCohort, WEIGHT_CONFIGS)
+
+
+def test_cohort_scores_match_dict_scores():
+    random.seed(7)
+    users = [generate_user(i) for i in range(1, 61)]
+    cohort = CompactCohort()
+    for user in users:
+        cohort.append(user)
+
+    for negative in (False, True):
+        weights = WEIGHT_CONFIGS[0]['weights']
+        for i in range(len(users)):
+            for j in range(i + 1, len(users)):
+                expected = calculate_match_score(users[i], users[j], weights, negative)
+                assert calculate_cohort_match_score(cohort, i, j, weights, negative) == expected
+
+
+def test_generate_uses_same_random_stream():
+    random.seed(42)
+    users = [generate_user(i) for i in range(1, 21)]
+    expected = CompactCohort()
+    for user in users:
+        expected.append(user)
+
+    random.seed(42)
+    cohort = CompactCohort.generate(20)
+    assert cohort.ids == expected.ids
+    assert cohort.strengths == expected.strengths
+    assert cohort.weaknesses == expected.weaknesses
+    assert cohort.codes == expected.codes
+
+
+if __name__ == '__main__':
+    test_cohort_scores_match_dict_scores()
+    test_generate_uses_same_random_stream()
+    print("✅ Compact cohort scoring matches dict scoring")
@@ -0,0 +1,52 @@
+"""
+TEST: Background job queue
+Higher priority jobs run first; job records outlive the process that ran them
+"""
+
+import os
+import sys
+import tempfile
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from jobs import JobQueue, JobStore
+
+
+def test_priority_order():
+    queue = JobQueue(workers=1)
+    gate = threading.Event()
+    order = []
+    blocker = queue.submit('block', gate.wait)
+    jobs = [queue.submit(priority, lambda p=priority: order.append(p), priority)
+            for priority in ('low', 'normal', 'high', 'low', 'high')]
+    gate.set()
+    for job in [blocker] + jobs:
+        assert job.done.wait(5)
+    assert order == ['high', 'high', 'normal', 'low', 'low']
+
+
+def test_status_from_store():
+    path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+    job = JobQueue(workers=1, store=JobStore(path)).submit('notes', lambda: {'content': 'ok'})
+    assert job.done.wait(5)
+
+    # Another worker (or the recycled one) only has the store
+    other = JobQueue(workers=1, store=JobStore(path))
+    status = other.snapshot(job.id)
+    assert status['status'] == 'done' and status['result'] == {'content': 'ok'}
+    assert other.wait(job.id, 1)['status'] == 'done'
+    assert other.snapshot('missing') is None
+
+
+def test_job_of_dead_worker_is_interrupted():
+    path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+    store = JobStore(path)
+    queue = JobQueue(workers=1, store=store)
+    gate = threading.Event()
+    job = queue.submit('presession_quiz', gate.wait)
+    with store._transaction() as conn:
+        conn.execute("UPDATE jobs SET pid = ? WHERE id = ?", (2 ** 22 + 1, job.id))
+
+    status = JobQueue(store=JobStore(path)).wait(job.id, 1)
+    assert status['status'] == 'failed' and status['interrupted']
+    gate.set()
@@ -0,0 +1,137 @@
+"""
+TEST: Materialized match index
+After any mix of saves, removals and rejections every row must equal a full
+rescan, and a second index on the same store must reach the same rows
+"""
+
+import heapq
+import os
+import random
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from matching import MatchIndex, MatchStore, calculate_match_score, normalize_profile, _rank
+
+SUBJECTS = ['calculus', 'physics', 'chemistry', 'biology', 'history', 'python', 'statistics']
+CHOICES = {
+    'availability': ['weekdays', 'weekends', 'evenings'],
+    'preferredMode': ['online', 'in-person'],
+    'primaryGoal': ['exam prep', 'homework', 'projects'],
+    'preferredFrequency': ['daily', 'weekly'],
+    'partnerPreference': ['same', 'any'],
+    'sessionLength': ['30', '60', '90'],
+    'timeZone': ['est', 'pst'],
+    'studyPersonality': ['quiet', 'social']
+}
+
+
+def random_profile(rng, user_id):
+    subjects = rng.sample(SUBJECTS, rng.randint(2, 5))
+    split = rng.randint(1, len(subjects) - 1)
+    profile = {field: rng.choice(values) for field, values in CHOICES.items()}
+    profile.update(id=user_id, strengths=subjects[:split], weaknesses=subjects[split:])
+    return profile
+
+
+def full_rescan(index, user_id):
+    me = index.profiles[user_id]
+    entries = []
+    for other_id, other in index.profiles.items():
+        if other_id == user_id or other_id in index.rejected_ids(user_id):
+            continue
+        score, comp = calculate_match_score(me, other, index.weights)
+        if comp > 0:
+            entries.append(_rank(score, comp, other_id))
+    return heapq.nsmallest(index.top_k, entries)
+
+
+def apply_random_changes(rng, index, steps):
+    for _ in range(steps):
+        user_id = rng.randrange(60)
+        action = rng.random()
+        if action < 0.65:
+            index.upsert(user_id, random_profile(rng, user_id))
+        elif action < 0.8:
+            index.remove(user_id)
+        elif action < 0.95:
+            index.reject(user_id, rng.randrange(60))
+        else:
+            index.clear_rejections(user_id)
+
+
+def test_complementary_score_cap_and_quiz_bonus():
+    a = normalize_profile({'strengths': ['physics', 'python'], 'weaknesses': ['calculus', 'chemistry'],
+                           'preQuizResults': {'strugglingInWeaknesses': True}})
+    b = normalize_profile({'strengths': ['calculus', 'chemistry'], 'weaknesses': ['physics'],
+                           'preQuizResults': {'strugglingInStrengths': True}})
+    # 48 + 32 (capped at 80); B's weakness no longer counts
+    assert calculate_match_score(a, b) == (80, 2)
+
+    b = normalize_profile({'strengths': ['calculus'], 'weaknesses': ['history'],
+                           'preQuizResults': {'strugglingInStrengths': True}})
+    assert calculate_match_score(a, b) == (48, 1)
+    assert calculate_match_score(b, a) == (48, 1)
+
+
+def test_rows_match_full_rescan():
+    rng = random.Random(7)
+    index = MatchIndex(top_k=5)
+    for step in range(40):
+        apply_random_changes(rng, index, 25)
+        for user_id in index.profiles:
+            assert index.rows[user_id] == full_rescan(index, user_id), (step, user_id)
+    assert index.rows_patched > 0
+
+
+def test_store_restores_and_syncs_index():
+    rng = random.Random(3)
+    store = MatchStore(os.path.join(tempfile.mkdtemp(), 'matches.db'))
+    first = MatchIndex(top_k=5, store=store)
+    apply_random_changes(rng, first, 300)
+
+    # A recycled worker rebuilds everything from the store
+    second = MatchIndex(top_k=5, store=store)
+    second.sync()
+    assert second.profiles == first.profiles and second.rows == first.rows
+
+    # Later changes from one worker reach the other on its next sync
+    apply_random_changes(rng, first, 100)
+    second.sync()
+    assert second.profiles == first.profiles
+    for user_id in second.profiles:
+        assert second.rows[user_id] == full_rescan(second, user_id)
+        assert second.rejected_ids(user_id) == first.rejected_ids(user_id)
+
+
+def _two_workers():
+    store = MatchStore(os.path.join(tempfile.mkdtemp(), 'matches.db'))
+    return MatchIndex(store=store), MatchIndex(store=store)
+
+
+def test_worker_booted_on_empty_store_sees_removal():
+    a, b = _two_workers()
+    a.sync()
+    a.upsert('x', {'strengths': ['physics'], 'weaknesses': ['calculus']})
+    a.upsert('y', {'strengths': ['calculus'], 'weaknesses': ['physics']})
+    assert [m['userId'] for m in a.matches('y')] == ['x']
+
+    b.sync()
+    b.remove('x')
+    a.sync()
+    assert 'x' not in a and a.matches('y') == []
+
+
+def test_worker_booted_on_empty_store_sees_cleared_rejections():
+    a, b = _two_workers()
+    a.sync()
+    a.upsert('x', {'strengths': ['physics'], 'weaknesses': ['calculus']})
+    a.upsert('y', {'strengths': ['calculus'], 'weaknesses': ['physics']})
+    a.reject('x', 'y')
+    assert a.matches('x') == []
+
+    b.sync()
+    b.clear_rejections('x')
+    a.sync()
+    assert a.rejected_ids('x') == set()
+    assert [m['userId'] for m in a.matches('x')] == ['y']
@@ -0,0 +1,42 @@
+"""
+TEST: Prompt normalization
+Requests that differ only in case, whitespace, unicode form or list order
+must render the same prompt and share one cache key
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from prompts import build_presession_prompt, generate_prompt, normalize_topic
+from response_cache import cache_key
+
+
+def _key(prompt):
+    return cache_key(prompt, {'model': 'test'})
+
+
+def test_topic_variants_share_prompt_and_key():
+    variants = ['Linear Algebra', 'linear algebra ', '  LINEAR   ALGEBRA', 'Ｌｉｎｅａｒ Algebra']
+    for content_type in ('notes', 'flashcards', 'quiz'):
+        prompts = {generate_prompt(content_type, topic) for topic in variants}
+        assert len(prompts) == 1, content_type
+        assert len({_key(p) for p in prompts}) == 1
+
+
+def test_all_caps_topics_are_lowercased():
+    assert normalize_topic("NEWTON'S LAWS") == normalize_topic("Newton's laws") == "newton's laws"
+    assert normalize_topic('LINEAR ALGEBRA') == 'linear algebra'
+
+
+def test_acronyms_and_mixed_case_keep_their_case():
+    assert normalize_topic('DNA replication') == 'DNA replication'
+    assert normalize_topic('mRNA  Vaccines') == 'mRNA vaccines'
+    assert normalize_topic('Intro to JavaScript') == 'intro to JavaScript'
+
+
+def test_subject_order_and_duplicates_share_prompt_and_key():
+    a = build_presession_prompt(['Calculus', 'Physics'], ['Organic Chemistry'])
+    b = build_presession_prompt(['physics ', 'CALCULUS', 'Calculus'], ['organic chemistry'])
+    assert a == b and _key(a) == _key(b)
+    assert a != build_presession_prompt(['Physics'], ['Calculus', 'Organic Chemistry'])
@@ -0,0 +1,78 @@
+"""
+TEST: Question bank
+Quiz slots are split across subjects, and each user is served questions
+they have not seen before repeats
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from question_bank import QuestionBank, allocate_slots
+
+
+def _bank():
+    return QuestionBank(os.path.join(tempfile.mkdtemp(), 'questions.db'))
+
+
+def _questions(subject, n):
+    return [{'question': f'{subject} question {i}?', 'options': ['a', 'b', 'c', 'd'],
+             'correctAnswer': 'A', 'level': 'EASY'} for i in range(n)]
+
+
+def _texts(picked):
+    return {q['question'] for q in picked}
+
+
+def test_allocate_strengths_only():
+    assert allocate_slots(['Calculus', 'Physics', 'Chemistry'], []) == [
+        ('calculus', 'STRENGTH', 7), ('physics', 'STRENGTH', 7), ('chemistry', 'STRENGTH', 6)]
+
+
+def test_allocate_both_lists():
+    slots = allocate_slots(['Calculus', ' calculus', 'Physics'], ['History'])
+    assert slots == [('calculus', 'STRENGTH', 5), ('physics', 'STRENGTH', 5), ('history', 'WEAKNESS', 10)]
+    assert allocate_slots([], ['', None]) == []
+
+
+def test_allocate_more_subjects_than_slots():
+    strengths = [f'subject {i}' for i in range(15)]
+    slots = allocate_slots(strengths, ['history'], total=20)
+    strength_slots = [s for s in slots if s[1] == 'STRENGTH']
+    # 10 strength slots: the first 10 subjects get one each, the rest none
+    assert strength_slots == [(f'subject {i}', 'STRENGTH', 1) for i in range(10)]
+    assert slots[-1] == ('history', 'WEAKNESS', 10)
+    assert sum(n for _, _, n in slots) == 20
+
+
+def test_unseen_questions_come_first_per_user():
+    bank = _bank()
+    bank.add('Calculus', 'STRENGTH', _questions('calculus', 6))
+
+    first = _texts(bank.pick_slots([('calculus', 'STRENGTH', 3)], user_id='alice')[0])
+    second = _texts(bank.pick_slots([('calculus', 'STRENGTH', 3)], user_id='alice')[0])
+    assert len(first) == len(second) == 3 and not first & second
+    assert bank.available('calculus', 'STRENGTH', user_id='alice') == 0
+
+    # Another user still sees everything as unseen
+    assert bank.available('calculus', 'STRENGTH', user_id='bob') == 6
+
+    # Once all are seen, repeats fill the quiz
+    third = bank.pick_slots([('calculus', 'STRENGTH', 4)], user_id='alice')[0]
+    assert len(third) == 4
+
+
+def test_short_subject_keeps_other_slots():
+    bank = _bank()
+    bank.add('Calculus', 'STRENGTH', _questions('calculus', 5))
+    bank.add('Physics', 'WEAKNESS', _questions('physics', 1))
+
+    calculus, physics, missing = bank.pick_slots(
+        [('Calculus', 'STRENGTH', 3), ('physics', 'WEAKNESS', 3), ('biology', 'WEAKNESS', 2)],
+        user_id='alice')
+    assert len(calculus) == 3 and len(physics) == 1 and missing == []
+    assert all(q['subject'] == 'calculus' for q in calculus)
+    # Both slots' picks were recorded as served
+    assert bank.available('calculus', 'STRENGTH', user_id='alice') == 2
+    assert bank.available('physics', 'WEAKNESS', user_id='alice') == 0
@@ -0,0 +1,97 @@
+"""
+TEST: Quiz text parsing
+Gemini's quiz output varies in markdown and completeness; only whole
+questions (text, 4 options, correct answer) may come out of the parser
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from quiz import format_question, missing_questions, parse_question_block, parse_quiz
+
+PLAIN = """Question 1 [STRENGTH - HARD]
+What is the derivative of x^2?
+A) x
+B) 2x
+C) x^2
+D) 2
+Correct Answer: B
+Explanation: Power rule."""
+
+BOLD = """**Question 12 [WEAKNESS - EASY]**
+**Which gas do plants absorb?**
+**A)** Oxygen
+**B)** Carbon dioxide
+**C)** Nitrogen
+**D)** Helium
+**Correct Answer:** B
+**Explanation:** Photosynthesis uses CO2."""
+
+
+def _question(number, answer='A'):
+    return (f"Question {number} [STRENGTH - EASY]\nQuestion text {number}?\n"
+            f"A) one\nB) two\nC) three\nD) four\nCorrect Answer: {answer}")
+
+
+def test_plain_block():
+    parsed = parse_question_block(1, PLAIN)
+    assert parsed == {
+        'number': 1,
+        'category': 'STRENGTH',
+        'level': 'HARD',
+        'difficulty': '[STRENGTH - HARD]',
+        'question': 'What is the derivative of x^2?',
+        'options': ['x', '2x', 'x^2', '2'],
+        'correctAnswer': 'B',
+        'explanation': 'Power rule.'
+    }
+
+
+def test_markdown_bold_variants():
+    parsed = parse_question_block(12, BOLD)
+    assert parsed['category'] == 'WEAKNESS' and parsed['level'] == 'EASY'
+    assert parsed['question'] == 'Which gas do plants absorb?'
+    assert parsed['options'] == ['Oxygen', 'Carbon dioxide', 'Nitrogen', 'Helium']
+    assert parsed['correctAnswer'] == 'B'
+    assert parsed['explanation'] == 'Photosynthesis uses CO2.'
+
+    heading = BOLD.replace('**Question 12 [WEAKNESS - EASY]**', '### Question 12').replace('**', '')
+    parsed = parse_quiz(heading)[12]
+    # No tag: numbers past the first half are weaknesses
+    assert parsed['difficulty'] == '[WEAKNESS]'
+    assert parsed['options'][1] == 'Carbon dioxide'
+
+
+def test_missing_or_extra_options():
+    three = PLAIN.replace('D) 2\n', '')
+    assert parse_question_block(1, three) is None
+
+    blank = PLAIN.replace('D) 2', 'D)')
+    assert parse_question_block(1, blank) is None
+
+    extra = PLAIN.replace('D) 2\n', 'D) 2\nE) 3\n')
+    assert parse_question_block(1, extra)['options'] == ['x', '2x', 'x^2', '2']
+
+
+def test_missing_answer_line():
+    no_answer = PLAIN.replace('Correct Answer: B\n', '')
+    assert parse_question_block(1, no_answer) is None
+    assert parse_question_block(1, 'Question 1 [STRENGTH - HARD]') is None
+
+
+def test_missing_question_numbers():
+    text = '\n\n'.join([_question(1), _question(2).replace('Correct Answer: A', ''), _question(4)])
+    questions = parse_quiz(text)
+    assert sorted(questions) == [1, 4]
+    assert missing_questions(questions, total=5) == [2, 3, 5]
+
+
+def test_repeated_number_keeps_first_valid_copy():
+    text = '\n\n'.join([_question(3, 'A'), _question(3, 'C')])
+    assert parse_quiz(text)[3]['correctAnswer'] == 'A'
+
+
+def test_format_round_trip():
+    parsed = parse_question_block(12, BOLD)
+    assert parse_quiz(format_question(parsed))[12] == parsed
@@ -0,0 +1,130 @@
+"""
+TEST: Gemini rate limiter
+RPM/TPM token buckets, bounded quota waits and adaptive backoff on 429s,
+run against a fake clock (asyncio.sleep advances it instead of sleeping)
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitExceeded, retry_after_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock)
+    monkeypatch.setattr(rate_limiter.asyncio, 'sleep', clock.sleep)
+    return clock
+
+
+def acquire(limiter, prompt_tokens=100):
+    return asyncio.run(limiter.acquire(prompt_tokens))
+
+
+def test_rpm_wait(clock):
+    limiter = RateLimiter(rpm=2, tpm=10 ** 6, max_wait=120)
+    start = clock.now
+    acquire(limiter)
+    acquire(limiter)
+    assert clock.now == start
+
+    # The third call waits for one request token at 2/minute
+    acquire(limiter)
+    assert clock.now - start == pytest.approx(30)
+    assert limiter.stats()['total_wait_seconds'] == pytest.approx(30)
+
+
+def test_tpm_wait_uses_prompt_and_output_estimate(clock):
+    limiter = RateLimiter(rpm=100, tpm=6000, max_wait=120)
+    assert acquire(limiter, 2000) == 3000  # 2000 prompt + 1000 output estimate
+    acquire(limiter, 2000)
+    start = clock.now
+    acquire(limiter, 2000)
+    # Bucket is empty: 3000 tokens at 100/second
+    assert clock.now - start == pytest.approx(30)
+
+
+def test_rejects_past_max_wait(clock):
+    limiter = RateLimiter(rpm=1, tpm=10 ** 6, max_wait=10)
+    acquire(limiter)
+    start = clock.now
+    with pytest.raises(RateLimitExceeded):
+        acquire(limiter)
+    assert clock.now == start  # fails fast instead of sleeping first
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_rate_limited_pauses_and_halves_rate(clock):
+    limiter = RateLimiter(rpm=60, tpm=10 ** 6, max_wait=120)
+    assert limiter.record_rate_limited(retry_after=5) == 5
+    assert limiter.scale == 0.5
+    assert limiter.stats()['paused_for'] == 5
+
+    start = clock.now
+    acquire(limiter)
+    assert clock.now - start == pytest.approx(5)
+
+    # Without a hint the pause doubles each time; the rate never drops below a quarter
+    assert limiter.record_rate_limited() == 2
+    assert limiter.record_rate_limited() == 4
+    assert limiter.scale == 0.25
+
+
+def test_halved_rate_slows_refill(clock):
+    limiter = RateLimiter(rpm=60, tpm=10 ** 6, max_wait=120)
+    limiter.requests.tokens = 0
+    limiter.record_rate_limited(retry_after=0)
+    start = clock.now
+    acquire(limiter)
+    # One request token takes 1s at the nominal rate, 2s at half rate
+    assert clock.now - start == pytest.approx(2)
+
+
+def test_success_recovers_rate(clock):
+    limiter = RateLimiter(rpm=60, tpm=10 ** 6)
+    limiter.record_rate_limited()
+    limiter.record_rate_limited()
+    assert limiter.scale == 0.25 and limiter.backoff == 4
+
+    limiter.record_success(1100)
+    assert limiter.scale == pytest.approx(0.35) and limiter.backoff == 1.0
+    for _ in range(10):
+        limiter.record_success(1100)
+    assert limiter.scale == 1.0
+
+
+def test_success_settles_token_charge(clock):
+    limiter = RateLimiter(rpm=60, tpm=10000)
+    estimate = acquire(limiter, 100)
+    assert limiter.tokens.tokens == 10000 - estimate
+    usage = SimpleNamespace(prompt_token_count=100, candidates_token_count=400, total_token_count=500)
+    limiter.record_success(estimate, usage)
+    assert limiter.tokens.tokens == 10000 - 500
+    assert limiter.output_tokens == int(0.8 * 1000 + 0.2 * 400)
+
+
+def test_retry_after_seconds_formats():
+    assert retry_after_seconds(Exception('429 Resource exhausted. Please retry in 23.5s.')) == 23.5
+    assert retry_after_seconds(Exception('429 quota exceeded [retry_delay {\n  seconds: 17\n}\n]')) == 17
+    error = Exception('429')
+    error.response = SimpleNamespace(headers={'Retry-After': '8'})
+    assert retry_after_seconds(error) == 8
+    assert retry_after_seconds(Exception('500 internal error')) is None
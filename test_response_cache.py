@@ -0,0 +1,87 @@
+"""
+TEST: Response cache
+Byte-budget LRU eviction, per-content-type TTLs and hit/miss accounting
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import response_cache
+from response_cache import PersistentCache, ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=30)
+    cache.set('a', 'x' * 10)
+    cache.set('b', 'y' * 10)
+    cache.set('c', 'z' * 10)
+    assert cache.get('a') == 'x' * 10  # a is now the most recent
+
+    cache.set('d', 'w' * 10)
+    assert cache.peek('b') is None
+    assert [cache.peek(k) is not None for k in 'acd'] == [True, True, True]
+    stats = cache.stats()
+    assert stats['bytes'] == 30 and stats['entries'] == 3 and stats['evictions'] == 1
+
+
+def test_oversized_and_multibyte_entries():
+    cache = ResponseCache(max_bytes=10)
+    cache.set('big', 'x' * 11)
+    assert cache.peek('big') is None
+    cache.set('utf8', 'é' * 5)  # 10 bytes in UTF-8
+    assert cache.stats()['bytes'] == 10
+
+
+def test_ttl_expiry_per_content_type(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache.time, 'monotonic', clock)
+    cache = ResponseCache(ttls={'quiz': 60, 'notes': 600})
+    cache.set('quiz', 'q', content_type='quiz')
+    cache.set('notes', 'n', content_type='notes')
+
+    clock.now += 61
+    assert cache.get('quiz') is None
+    assert cache.get('notes') == 'n'
+    stats = cache.stats()
+    assert stats['expirations'] == 1 and stats['entries'] == 1 and stats['bytes'] == 1
+
+
+def test_hit_miss_counters_and_peek():
+    cache = ResponseCache()
+    assert cache.get('a') is None
+    cache.set('a', 'text')
+    assert cache.get('a') == 'text'
+    assert cache.get('a') == 'text'
+    # peek never counts
+    assert cache.peek('a') == 'text' and cache.peek('missing') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (2, 1, 0.667)
+
+
+def test_persistent_cache_counts_and_evicts_by_access(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    cache = PersistentCache(os.path.join(tempfile.mkdtemp(), 'cache.db'), max_bytes=30,
+                            access_flush_interval=3600)
+    cache.set('a', 'x' * 10)
+    clock.now += 1
+    cache.set('b', 'y' * 10)
+    clock.now += 1
+    assert cache.get('a') == 'x' * 10
+    assert cache.peek('b') == 'y' * 10 and cache.get('missing') is None
+
+    # a's buffered access time is written before set() evicts
+    cache.set('c', 'z' * 15)
+    assert cache.peek('a') is not None and cache.peek('b') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1)
@@ -0,0 +1,32 @@
+"""
+TEST: Multiprocess sharded pair scoring
+Worker results merged from ScoreStats partials must equal the serial run
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulate_matching import simulate_matching_with_config, balanced_row_chunks, WEIGHT_CONFIGS
+
+
+def test_chunks_cover_triangle_in_order():
+    for num_users, num_chunks in [(7, 10), (100, 16), (500, 64)]:
+        chunks = balanced_row_chunks(num_users, num_chunks)
+        assert chunks[0][0] == 0 and chunks[-1][1] == num_users
+        assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+        assert len(chunks) <= num_chunks
+
+
+def test_workers_match_serial():
+    configs = [WEIGHT_CONFIGS[0], dict(WEIGHT_CONFIGS[0], name='Negative', negative_marking=True)]
+    for config in configs:
+        serial = simulate_matching_with_config(config, num_users=120)
+        sharded = simulate_matching_with_config(config, num_users=120, workers=3)
+        assert sharded == serial, config['name']
+
+
+if __name__ == '__main__':
+    test_chunks_cover_triangle_in_order()
+    test_workers_match_serial()
+    print("✅ Sharded scoring matches serial run")
@@ -0,0 +1,62 @@
+"""
+TEST: Near-duplicate topic cache
+Close rewordings share a cached generation; more specific or different topics never do
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from similarity_cache import SimilarityCache
+
+
+def _cache_with(topic, threshold=0.6, content_type='notes'):
+    cache = SimilarityCache(threshold=threshold)
+    cache.add(content_type, topic, 'key-' + topic)
+    store = {'key-' + topic: 'text for ' + topic}
+    return cache, store
+
+
+def test_reworded_topic_hits():
+    cache, store = _cache_with('Newtons laws of motion')
+    found = cache.lookup('notes', "newton's laws", store.get)
+    assert found is not None
+    match, text = found
+    assert match.topic == 'Newtons laws of motion'
+    assert text == 'text for Newtons laws of motion'
+
+
+def test_more_specific_query_misses():
+    for cached, query in [('calculus', 'calculus 2'), ('integration', 'integration by parts'),
+                          ('photosynthesis', 'photosynthesis in plants')]:
+        cache, store = _cache_with(cached, threshold=0.5)
+        assert cache.lookup('notes', query, store.get) is None, query
+
+
+def test_different_numbers_and_words_miss():
+    for cached, query in [('calculus 2', 'calculus'), ('World War 1', 'World War 2'),
+                          ('organic chemistry', 'inorganic chemistry'), ('linear algebra', 'linear regression')]:
+        cache, store = _cache_with(cached, threshold=0.5)
+        assert cache.lookup('notes', query, store.get) is None, query
+
+
+def test_report_only_scores_without_serving():
+    cache, store = _cache_with('Newtons laws of motion', threshold=None)
+    assert cache.lookup('notes', "newton's laws", store.get) is None
+    stats = cache.stats()
+    assert stats['lookups'] == 1 and stats['hits'] == 0
+    assert stats['by_threshold']['0.6']['hits'] == 1
+    assert stats['by_threshold']['0.7']['hits'] == 0
+
+
+def test_only_configured_content_types():
+    cache, store = _cache_with('Newtons laws of motion', content_type='quiz')
+    assert cache.lookup('quiz', "newton's laws", store.get) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_stale_entry_is_dropped():
+    cache, _ = _cache_with('Newtons laws of motion')
+    assert cache.lookup('notes', "newton's laws", {}.get) is None
+    stats = cache.stats()
+    assert stats['stale'] == 1 and stats['entries'] == 0 and stats['hits'] == 0
@@ -0,0 +1,44 @@
+"""
+TEST: Vectorized NumPy engine vs reference Python engine
+Every weight configuration (plus a negative marking variant) must produce identical results,
+whether scored one config at a time or all configs in one shared pass
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from simulate_matching import simulate_matching_with_config, WEIGHT_CONFIGS
+from simulate_matching_numpy import simulate_matching_vectorized, simulate_all_configs
+
+NUM_USERS = 150
+
+CONFIGS = WEIGHT_CONFIGS + [
+    dict(WEIGHT_CONFIGS[0], name='Skills First + Negative Marking', negative_marking=True)
+]
+
+
+def test_vectorized_matches_reference():
+    for config in CONFIGS:
+        expected = simulate_matching_with_config(config, num_users=NUM_USERS)
+        actual = simulate_matching_vectorized(config, num_users=NUM_USERS)
+        assert actual == expected, config['name']
+        assert [type(v) for v in actual.values()] == [type(v) for v in expected.values()], config['name']
+
+
+def test_all_configs_in_one_pass_matches_reference():
+    results = simulate_all_configs(CONFIGS, num_users=NUM_USERS)
+    assert len(results) == len(CONFIGS)
+    for config, actual in zip(CONFIGS, results):
+        expected = simulate_matching_with_config(config, num_users=NUM_USERS)
+        assert actual == expected, config['name']
+
+
+if __name__ == '__main__':
+    test_vectorized_matches_reference()
+    test_all_configs_in_one_pass_matches_reference()
+    print(f"✅ Vectorized engine matches reference for {len(CONFIGS)} configs")